@@ -0,0 +1,109 @@
+import queue
+import unittest
+
+import alsaaudio  # type: ignore
+
+from turntable.audio import Listener
+
+
+class Stop(Exception): ...
+
+
+class Capture:
+    def __init__(self, reads: list) -> None:
+        self.reads = reads
+
+    def read(self):
+        if not self.reads:
+            raise Stop()
+        result = self.reads.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def getchannels(self):
+        return [2]
+
+    def getrates(self):
+        return 48000
+
+    def close(self): ...
+
+
+class StubListener(Listener):
+    """A Listener whose device, however often it's reopened, reads `script`."""
+
+    def open(self, period_size: int) -> None:
+        if not hasattr(self, "script"):
+            self.script: list = []
+            self.opened = 0
+        self.period_size = period_size
+        self.capture = Capture(self.script)
+        self.opened += 1
+
+
+class TestAdaptivePeriod(unittest.TestCase):
+    def setUp(self):
+        self.consumer: "queue.Queue" = queue.Queue()
+        self.listener = StubListener(
+            [self.consumer],
+            "default",
+            framerate=48000,
+            period_size=4096,
+            adaptive_period=True,
+            max_period_size=16384,
+        )
+        self.now = 0.0
+
+    def capture(self, seconds: float, reads: int = 1, every: int = 1) -> None:
+        """Feed periods for `seconds`, reading `reads` of them every `every`."""
+        for period in range(int(seconds * 48000 / self.listener.period_size)):
+            self.now += self.listener.period_size / 48000
+            self.consumer.put(period)
+            if period % every == 0:
+                for _ in range(reads):
+                    if not self.consumer.empty():
+                        self.consumer.get()
+            self.listener.adapt(self.now)
+
+    def test_ignores_queues_nobody_reads(self):
+        self.capture(120, reads=0)
+        self.assertEqual(4096, self.listener.period_size)
+        self.assertGreater(self.consumer.qsize(), self.listener.lag_threshold)
+
+    def test_grows_while_consumer_lags(self):
+        self.capture(20, every=2)
+        self.assertEqual(8192, self.listener.period_size)
+
+    def test_shrinks_once_lag_clears(self):
+        self.capture(20, every=2)
+        self.assertEqual(8192, self.listener.period_size)
+        self.capture(120, reads=100)
+        self.assertEqual(4096, self.listener.period_size)
+
+
+class TestCaptureErrors(unittest.TestCase):
+    def listen(self, *reads):
+        consumer: "queue.Queue" = queue.Queue()
+        listener = StubListener([consumer], "default", framerate=48000)
+        listener.script.extend(reads)
+        with self.assertRaises(Stop):
+            listener.run()
+        return listener, [consumer.get_nowait() for _ in range(consumer.qsize())]
+
+    def test_reopens_after_device_error(self):
+        period = (4, bytes(16))
+        listener, pcms = self.listen(
+            period, alsaaudio.ALSAAudioError("No such device"), period
+        )
+        self.assertEqual(1, listener.errors)
+        self.assertEqual(2, listener.opened)
+        self.assertEqual([False, True], [pcm.discontinuity for pcm in pcms])
+        self.assertEqual([0, 2], [pcm.sequence for pcm in pcms])
+
+    def test_overrun_flags_discontinuity(self):
+        period = (4, bytes(16))
+        listener, pcms = self.listen(period, (-32, b""), period)
+        self.assertEqual(1, listener.xruns)
+        self.assertEqual(1, listener.opened)
+        self.assertEqual([False, True], [pcm.discontinuity for pcm in pcms])
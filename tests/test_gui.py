@@ -0,0 +1,52 @@
+import unittest
+
+from turntable.gui import Plot, QualityController
+
+
+class TestQualityController(unittest.TestCase):
+    def setUp(self):
+        self.plot = Plot(None, 0, 0, 100, 100, smoothing=4, line_spacing=4)
+        self.controller = QualityController(self.plot, fps=60, window=3)
+
+    def run_window(self, frame_time):
+        for _ in range(self.controller.window):
+            self.controller.update(frame_time)
+
+    def test_waits_for_a_full_window(self):
+        for _ in range(self.controller.window - 1):
+            self.controller.update(1.0)
+        self.assertEqual(0, self.controller.level)
+        self.controller.update(1.0)
+        self.assertEqual(1, self.controller.level)
+
+    def test_steps_down_when_over_budget(self):
+        self.run_window(1 / 50)
+        self.assertEqual(1, self.controller.level)
+        self.assertEqual(8, self.plot.line_spacing)
+        self.assertEqual(4, self.plot.smoothing)
+        self.run_window(1 / 50)
+        self.assertEqual(2, self.controller.level)
+        self.assertEqual(16, self.plot.line_spacing)
+        self.assertEqual(2, self.plot.smoothing)
+
+    def test_stops_at_cheapest_level(self):
+        for _ in range(10):
+            self.run_window(1.0)
+        self.assertEqual(4, self.controller.level)
+        self.assertEqual(30, self.controller.fps)
+        self.assertEqual(32, self.plot.line_spacing)
+        self.assertEqual(1, self.plot.smoothing)
+
+    def test_steps_up_with_headroom(self):
+        self.run_window(1.0)
+        self.run_window(1.0)
+        self.assertEqual(2, self.controller.level)
+        # Within budget, but not enough headroom to step back up.
+        self.run_window(0.8 / 60)
+        self.assertEqual(2, self.controller.level)
+        self.run_window(0.5 / 60)
+        self.assertEqual(1, self.controller.level)
+        self.run_window(0.5 / 60)
+        self.assertEqual(0, self.controller.level)
+        self.assertEqual(4, self.plot.line_spacing)
+        self.assertEqual(4, self.plot.smoothing)
@@ -0,0 +1,105 @@
+import os
+import queue
+import tempfile
+import unittest
+
+from turntable.events import Exit, NewMetadata, StartedPlaying, StoppedPlaying
+from turntable.history import History, HistoryStore, Session
+
+
+class TestHistoryStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "history.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_batches_writes(self):
+        store = HistoryStore(self.path, batch_size=3, commit_interval=3600)
+        reader = HistoryStore(self.path)
+        store.append(Session(1.0, 2.0, "A"))
+        store.append(Session(3.0, 4.0, "B"))
+        self.assertEqual([], reader.between(0, 10))
+        store.append(Session(5.0, 6.0, "C"))
+        self.assertEqual(["A", "B", "C"], [s.title for s in reader.between(0, 10)])
+        store.close()
+        reader.close()
+
+    def test_close_flushes_pending_sessions(self):
+        store = HistoryStore(self.path, batch_size=10)
+        store.append(Session(1.0, 2.0, "A", 0.5, 3.0, 0.2))
+        store.close()
+        store = HistoryStore(self.path)
+        self.assertEqual([Session(1.0, 2.0, "A", 0.5, 3.0, 0.2)], store.between(0, 10))
+        store.close()
+
+    def test_between(self):
+        store = HistoryStore(self.path)
+        for started in range(10):
+            store.append(Session(float(started), started + 0.5, f"Song {started}"))
+        self.assertEqual(
+            ["Song 3", "Song 4", "Song 5"], [s.title for s in store.between(3, 6)]
+        )
+        store.close()
+
+    def test_most_played(self):
+        store = HistoryStore(self.path)
+        for started, title in enumerate(["A", "B", "A", None, "C", "A", "B"]):
+            store.append(Session(float(started), started + 0.5, title))
+        self.assertEqual([("A", 3), ("B", 2)], store.most_played(2))
+        self.assertEqual([("A", 2), ("B", 2), ("C", 1)], store.most_played(since=1))
+        self.assertEqual([("A", 1), ("B", 1)], store.most_played(until=2))
+        store.close()
+
+
+class TestHistory(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "history.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def record(self, *events):
+        history_events: "queue.Queue" = queue.Queue()
+        for event in events + (Exit(),):
+            history_events.put(event)
+        History(history_events, self.path).run()
+
+    def test_records_sessions(self):
+        self.record(
+            StartedPlaying(),
+            NewMetadata("A", confidence=0.5, identified_after=3.0),
+            StoppedPlaying(),
+            # A stop without a start (as at shutdown when idle) isn't a session.
+            StoppedPlaying(),
+        )
+        store = HistoryStore(self.path)
+        (session,) = store.between(0, float("inf"))
+        self.assertEqual("A", session.title)
+        self.assertEqual(0.5, session.confidence)
+        self.assertEqual(3.0, session.identified_after)
+        self.assertLessEqual(session.started, session.stopped)
+        store.close()
+
+    def test_unidentified_sessions_are_untitled(self):
+        unknown = NewMetadata("Unknown Artist - Unknown Album", identified=False)
+        self.record(
+            StartedPlaying(),
+            unknown,
+            StoppedPlaying(),
+            StartedPlaying(),
+            unknown,
+            StoppedPlaying(),
+            StartedPlaying(),
+            NewMetadata("A"),
+            StoppedPlaying(),
+        )
+        store = HistoryStore(self.path)
+        self.assertEqual(
+            [None, None, "A"], [s.title for s in store.between(0, float("inf"))]
+        )
+        self.assertEqual([("A", 1)], store.most_played())
+        self.assertEqual([("A", 1)], store.most_played(since=0))
+        store.close()
@@ -0,0 +1,38 @@
+import socket
+import struct
+import unittest
+
+from turntable.hue import HueStream
+
+
+class TestHueStream(unittest.TestCase):
+    def setUp(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.settimeout(1)
+        self.stream = HueStream("127.0.0.1", self.server.getsockname()[1])
+
+    def tearDown(self):
+        self.stream.close()
+        self.server.close()
+
+    def test_encode_frame(self):
+        frame = HueStream.encode(7, {3: (0xFFFF, 0, 0x1234)})
+        self.assertEqual(b"HueStream", frame[:9])
+        self.assertEqual(bytes([1, 0, 7, 0, 0, 0, 0]), frame[9:16])
+        self.assertEqual(struct.pack(">BHHHH", 0, 3, 0xFFFF, 0, 0x1234), frame[16:])
+
+    def test_send_increments_sequence(self):
+        self.stream.send({1: (1, 1, 1)})
+        self.stream.send({1: (2, 2, 2)})
+        first = self.server.recv(1024)
+        second = self.server.recv(1024)
+        self.assertEqual(0, first[11])
+        self.assertEqual(1, second[11])
+
+    def test_send_splits_large_groups(self):
+        self.stream.send({light: (0, 0, 0) for light in range(15)})
+        first = self.server.recv(1024)
+        second = self.server.recv(1024)
+        self.assertEqual(16 + 10 * 9, len(first))
+        self.assertEqual(16 + 5 * 9, len(second))
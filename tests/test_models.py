@@ -0,0 +1,61 @@
+import unittest
+
+from turntable.models import PCM, JitterBuffer, LatencyTracker
+
+
+class TestPCMTiming(unittest.TestCase):
+    def test_slice_offsets_timestamp(self):
+        pcm = PCM(10, 1, bytes(20), timestamp=100.0, sequence=7)
+        self.assertEqual(100.5, pcm[5:].timestamp)
+        self.assertEqual(100.8, pcm[-2:].timestamp)
+        self.assertEqual(7, pcm[5:].sequence)
+
+    def test_append_tracks_latest_period(self):
+        buffer = PCM(10, 1, maxlen=20)
+        buffer.append(PCM(10, 1, bytes(20), timestamp=100.0, sequence=1))
+        buffer.append(PCM(10, 1, bytes(10), timestamp=101.0, sequence=2))
+        self.assertEqual(100.5, buffer.timestamp)
+        self.assertEqual(2, buffer.sequence)
+        self.assertEqual(0.5, buffer.age(now=102.0))
+
+
+class TestLatencyTracker(unittest.TestCase):
+    def test_detects_gaps(self):
+        tracker = LatencyTracker("test")
+        self.assertEqual(0, tracker.update(PCM(10, 1, bytes(2), sequence=1)))
+        self.assertEqual(0, tracker.update(PCM(10, 1, bytes(2), sequence=2)))
+        self.assertEqual(2, tracker.update(PCM(10, 1, bytes(2), sequence=5)))
+        self.assertEqual(1, tracker.gaps)
+        self.assertEqual(2, tracker.missing)
+
+    def test_measures_age_of_newest_frame(self):
+        tracker = LatencyTracker("test")
+        tracker.update(PCM(10, 1, bytes(20), timestamp=100.0), now=101.25)
+        self.assertAlmostEqual(0.25, tracker.stats()["last"])
+
+
+class TestJitterBuffer(unittest.TestCase):
+    def test_pads_until_primed(self):
+        buffer = JitterBuffer(framesize=4, target=4)
+        buffer.put(b"\x01" * 8)
+        self.assertEqual(bytes(8), buffer.get(2))
+        buffer.put(b"\x01" * 8)
+        self.assertEqual(b"\x01" * 8, buffer.get(2))
+        self.assertEqual(2, len(buffer))
+
+    def test_underrun_pads_and_reprimes(self):
+        buffer = JitterBuffer(framesize=4, target=2)
+        buffer.put(b"\x01" * 12)
+        buffer.get(2)
+        self.assertEqual(b"\x01" * 4 + bytes(4), buffer.get(2))
+        self.assertEqual(1, buffer.underruns)
+        self.assertFalse(buffer.primed)
+
+    def test_overrun_drops_oldest_to_target(self):
+        buffer = JitterBuffer(framesize=4, target=2, limit=4)
+        buffer.put(b"\x01" * 16)
+        buffer.put(b"\x02" * 8)
+        self.assertEqual(2, len(buffer))
+        self.assertEqual(1, buffer.overruns)
+        self.assertEqual(4, buffer.dropped)
+        self.assertEqual(b"\x02" * 8, buffer.get(2))
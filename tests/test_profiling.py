@@ -0,0 +1,63 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from turntable import profiling
+
+
+@unittest.skipUnless(os.path.exists("/proc/self/stat"), "needs procfs")
+class TestProfilingRequests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_skips_exited_processes(self):
+        child = subprocess.Popen([sys.executable, "-c", "pass"])
+        child.wait()
+        profiling.write_pids(self.directory.name, {"Child": child.pid})
+        self.assertEqual({}, profiling.request(self.directory.name, 1))
+
+    def test_signals_only_the_recorded_process(self):
+        # Keep the child alive with SIGUSR1 ignored, so a stray signal can't
+        # kill it even if the check were missing.
+        child = subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                "import signal, sys; signal.signal(signal.SIGUSR1, signal.SIG_IGN);"
+                " print(flush=True); sys.stdin.read()",
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        try:
+            child.stdout.readline()
+            profiling.write_pids(self.directory.name, {"Child": child.pid})
+            path = os.path.join(self.directory.name, profiling.PIDS_FILE)
+            with open(path) as pids_file:
+                pids = json.load(pids_file)
+            self.assertEqual(profiling.start_time(child.pid), pids["Child"][1])
+            self.assertEqual(
+                {"Child": child.pid}, profiling.request(self.directory.name, 1)
+            )
+            pids["Child"][1] = "0"
+            with open(path, "w") as pids_file:
+                json.dump(pids, pids_file)
+            self.assertEqual({}, profiling.request(self.directory.name, 1))
+        finally:
+            child.stdin.close()
+            child.wait()
+            child.stdout.close()
+
+    def test_remove_pids(self):
+        profiling.write_pids(self.directory.name, {"Main": os.getpid()})
+        profiling.remove_pids(self.directory.name)
+        profiling.remove_pids(self.directory.name)
+        self.assertFalse(
+            os.path.exists(os.path.join(self.directory.name, profiling.PIDS_FILE))
+        )
@@ -0,0 +1,104 @@
+import asyncio
+import queue
+import struct
+import unittest
+
+from turntable.models import PCM
+from turntable.server import (
+    CLOSE_PROTOCOL_ERROR,
+    CLOSE_TOO_BIG,
+    OPCODE_BINARY,
+    OPCODE_CLOSE,
+    OPCODE_TEXT,
+    StatusServer,
+    accept_key,
+    encode_frame,
+    encode_levels,
+)
+
+
+class TestWebSocketEncoding(unittest.TestCase):
+    def test_accept_key(self):
+        # Example handshake from RFC 6455, section 1.3
+        self.assertEqual(
+            "s3pPLMBiTxaQ9kYGzzhZRbK+xOo=", accept_key("dGhlIHNhbXBsZSBub25jZQ==")
+        )
+
+    def test_encode_short_frame(self):
+        self.assertEqual(b"\x81\x05hello", encode_frame(OPCODE_TEXT, b"hello"))
+
+    def test_encode_extended_length(self):
+        frame = encode_frame(OPCODE_BINARY, bytes(300))
+        self.assertEqual(b"\x82\x7e", frame[:2])
+        self.assertEqual(300, struct.unpack(">H", frame[2:4])[0])
+        self.assertEqual(304, len(frame))
+
+    def test_encode_levels(self):
+        raw = struct.pack("<4096h", *([10000, -10000] * 2048))
+        frame = encode_levels(PCM(44100, 2, raw), 16)
+        self.assertEqual(2 + 2 + 16, len(frame))
+
+    def test_encode_silence(self):
+        frame = encode_levels(PCM(44100, 2, bytes(4096)), 16)
+        self.assertEqual(bytes(18), frame[2:])
+
+
+class TestStatusServerConnections(unittest.TestCase):
+    HANDSHAKE = (
+        b"GET /ws HTTP/1.1\r\nHost: localhost\r\n"
+        b"Upgrade: websocket\r\nConnection: Upgrade\r\n"
+    )
+    KEY = b"Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n"
+    VERSION = b"Sec-WebSocket-Version: 13\r\n"
+
+    def exchange(self, *messages: bytes) -> bytes:
+        """Send messages to a StatusServer connection and read until it closes."""
+
+        async def run() -> bytes:
+            status = StatusServer(queue.Queue(), queue.Queue())
+            server = await asyncio.start_server(status.handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            for message in messages:
+                writer.write(message)
+            response = await asyncio.wait_for(reader.read(), 5)
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return response
+
+        return asyncio.run(run())
+
+    def test_handshake(self):
+        response = self.exchange(
+            self.HANDSHAKE + self.KEY + self.VERSION + b"\r\n",
+            # Masked close frame
+            b"\x88\x80" + bytes(4),
+        )
+        self.assertTrue(response.startswith(b"HTTP/1.1 101 "))
+        self.assertIn(b"Sec-WebSocket-Accept: s3pPLMBiTxaQ9kYGzzhZRbK+xOo=", response)
+
+    def test_rejects_missing_key(self):
+        response = self.exchange(self.HANDSHAKE + self.VERSION + b"\r\n")
+        self.assertTrue(response.startswith(b"HTTP/1.1 400 "))
+
+    def test_rejects_missing_version(self):
+        response = self.exchange(self.HANDSHAKE + self.KEY + b"\r\n")
+        self.assertTrue(response.startswith(b"HTTP/1.1 400 "))
+
+    def test_closes_on_oversized_frame(self):
+        response = self.exchange(
+            self.HANDSHAKE + self.KEY + self.VERSION + b"\r\n",
+            # Ping claiming a 64-bit payload length
+            b"\x89\xff" + struct.pack(">Q", 1 << 40),
+        )
+        close = encode_frame(OPCODE_CLOSE, struct.pack(">H", CLOSE_TOO_BIG))
+        self.assertTrue(response.endswith(close))
+
+    def test_closes_on_data_frame(self):
+        response = self.exchange(
+            self.HANDSHAKE + self.KEY + self.VERSION + b"\r\n",
+            b"\x81\x85" + bytes(4) + b"hello",
+        )
+        close = encode_frame(OPCODE_CLOSE, struct.pack(">H", CLOSE_PROTOCOL_ERROR))
+        self.assertTrue(response.endswith(close))
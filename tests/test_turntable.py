@@ -1,10 +1,20 @@
 from itertools import chain
+import queue
 import struct
 from typing import List
 import unittest
 
+from dejavu.config.settings import INPUT_CONFIDENCE, SONG_ID, SONG_NAME  # type: ignore
+
+from turntable.events import NewMetadata
 from turntable.models import PCM
-from turntable.turntable import PCMRecognizer
+from turntable.turntable import (
+    ParallelPCMRecognizer,
+    PCMRecognizer,
+    Scheduler,
+    SongCache,
+    Turntable,
+)
 
 
 class TestPCMRecognizer(unittest.TestCase):
@@ -33,3 +43,235 @@ class TestPCMRecognizer(unittest.TestCase):
         pcm = self.channel_data_to_pcm(channels)
         converted = PCMRecognizer.pcm_to_channel_data(pcm)
         self.assertEqual(channels, converted)
+
+
+class TestParallelPCMRecognizer(unittest.TestCase):
+    def setUp(self):
+        self.recognizer = ParallelPCMRecognizer(None, None, None, 4, overlap=1.0)
+
+    def test_windows_align_to_hop(self):
+        windows = self.recognizer.windows(100000, 4, 1000)
+        for start, _ in windows:
+            self.assertEqual(0, start % self.recognizer.hop)
+
+    def test_windows_cover_and_overlap(self):
+        windows = self.recognizer.windows(100000, 4, 1000)
+        self.assertEqual(0, windows[0][0])
+        self.assertEqual(100000, windows[-1][1])
+        for (_, stop), (start, _) in zip(windows, windows[1:]):
+            self.assertEqual(1000, stop - start)
+
+
+class SongDatabase:
+    def get_song_by_id(self, song_id: int):
+        return {"id": song_id} if song_id > 0 else None
+
+
+class CachingRecognizer(PCMRecognizer):
+    def __init__(self, **kwargs) -> None:
+        dejavu = type("Dejavu", (), {"db": SongDatabase()})()
+        super().__init__(dejavu, **kwargs)
+        self.loaded: List[int] = []
+
+    def song_hashes(self, song_id: int):
+        self.loaded.append(song_id)
+        return {}
+
+
+class TestPCMRecognizerCache(unittest.TestCase):
+    def test_loads_neighbours_lazily_nearest_first(self):
+        recognizer = CachingRecognizer(cache=SongCache(5), cache_neighbours=2)
+        recognizer.remember(10)
+        self.assertEqual([10], recognizer.loaded)
+        while recognizer.load_neighbour():
+            ...
+        self.assertEqual([10, 9, 11, 8, 12], recognizer.loaded)
+        self.assertEqual(5, len(recognizer.cache))
+
+    def test_skips_missing_and_cached_songs(self):
+        recognizer = CachingRecognizer(cache=SongCache(5), cache_neighbours=2)
+        recognizer.remember(1)
+        while recognizer.load_neighbour():
+            ...
+        recognizer.remember(2)
+        while recognizer.load_neighbour():
+            ...
+        self.assertEqual([1, 2, 3, 4], recognizer.loaded)
+
+    def test_caps_neighbours_to_cache_size(self):
+        recognizer = CachingRecognizer(cache=SongCache(16), cache_neighbours=8)
+        self.assertEqual(7, recognizer.cache_neighbours)
+
+
+class TestScheduler(unittest.TestCase):
+    def test_runs_due_actions_in_deadline_order(self):
+        fired = []
+        scheduler = Scheduler()
+        scheduler.schedule("b", 2.0, lambda now: fired.append("b"))
+        scheduler.schedule("a", 1.0, lambda now: fired.append("a"))
+        scheduler.schedule("c", 5.0, lambda now: fired.append("c"))
+        self.assertEqual(1.0, scheduler.timeout(0.0))
+        scheduler.run(3.0)
+        self.assertEqual(["a", "b"], fired)
+        self.assertEqual(2.0, scheduler.timeout(3.0))
+
+    def test_cancel_and_replace(self):
+        fired = []
+        scheduler = Scheduler()
+        scheduler.schedule("a", 1.0, lambda now: fired.append("a"))
+        scheduler.schedule("b", 1.0, lambda now: fired.append("b"))
+        scheduler.schedule("a", 4.0, lambda now: fired.append("a2"))
+        scheduler.cancel("b")
+        self.assertEqual(4.0, scheduler.timeout(0.0))
+        scheduler.run(5.0)
+        self.assertEqual(["a2"], fired)
+        self.assertIsNone(scheduler.timeout(5.0))
+
+
+class TestSongCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = SongCache(2)
+        cache.add(1, {}, {})
+        cache.add(2, {}, {})
+        cache.touch(1)
+        cache.add(3, {}, {})
+        self.assertIn(1, cache)
+        self.assertNotIn(2, cache)
+        self.assertIn(3, cache)
+
+    def test_match_aligns_offsets(self):
+        cache = SongCache(2)
+        cache.add(1, {}, {"AA": [10], "BB": [11], "CC": [40]})
+        cache.add(2, {}, {"AA": [3], "DD": [7]})
+        hashes = {("aa", 0), ("bb", 1), ("cc", 2)}
+        self.assertEqual([(1, 10, 3, 2), (2, 3, 1, 1)], cache.match(hashes))
+
+
+class StubRecognizer:
+    hop = 250
+
+    def __init__(self, confidences: List[float]) -> None:
+        self.confidences = confidences
+        self.fingerprinted: List[tuple] = []
+        self.remembered: List[int] = []
+
+    def fingerprint(self, sample: PCM, offset: int = 0):
+        self.fingerprinted.append((len(sample), offset))
+        return {(str(offset), offset)}, 0.0
+
+    def match(self, hashes):
+        result = {
+            INPUT_CONFIDENCE: self.confidences.pop(0),
+            SONG_NAME: b"Artist - Song",
+            SONG_ID: 1,
+        }
+        return [result], 0.0, 0.0
+
+    def remember(self, song_id: int) -> None:
+        self.remembered.append(song_id)
+
+    def load_neighbour(self) -> bool:
+        return False
+
+
+class TestIdentify(unittest.TestCase):
+    def turntable(self, confidences: List[float], **kwargs) -> Turntable:
+        self.events: "queue.Queue" = queue.Queue()
+        self.recognizer = StubRecognizer(confidences)
+        options = dict(
+            fingerprint_identify_seconds=5,
+            fingerprint_min_seconds=2,
+            fingerprint_step_seconds=1,
+            fingerprint_confidence=0.5,
+            fingerprint_step_overlap=0.5,
+            sample_seconds=10,
+        )
+        options.update(kwargs)
+        return Turntable(
+            None, None, [self.events], 1000, 1, None, self.recognizer, **options
+        )
+
+    @staticmethod
+    def feed(turntable: Turntable, seconds: float, discontinuity=False) -> None:
+        silence = bytes(2 * int(1000 * seconds))
+        turntable.update_audio(PCM(1000, 1, silence, discontinuity=discontinuity))
+
+    def test_extends_window_from_hop_aligned_overlap(self):
+        turntable = self.turntable([0.1, 0.9])
+        self.feed(turntable, 2)
+        turntable.identify(0)
+        self.feed(turntable, 1)
+        turntable.identify(1)
+        # The second segment starts 0.5s before the old edge, at a whole hop.
+        self.assertEqual([(2000, 0), (1500, 6)], self.recognizer.fingerprinted)
+        event = self.events.get_nowait()
+        self.assertIsInstance(event, NewMetadata)
+        self.assertEqual("Artist - Song", event.title)
+        self.assertTrue(event.identified)
+        self.assertEqual(0.9, event.confidence)
+        self.assertTrue(turntable.identified)
+        self.assertIsNone(turntable.identification)
+        self.assertEqual([1], self.recognizer.remembered)
+
+    def test_waits_for_new_audio(self):
+        turntable = self.turntable([0.1])
+        self.feed(turntable, 2)
+        turntable.identify(0)
+        turntable.identify(1)
+        self.assertEqual([(2000, 0)], self.recognizer.fingerprinted)
+        self.assertEqual(2, turntable.scheduler.timeout(0))
+        self.assertTrue(self.events.empty())
+
+    def test_gives_up_at_identify_seconds(self):
+        turntable = self.turntable([0.1] * 4)
+        self.feed(turntable, 2)
+        turntable.identify(0)
+        for second in range(1, 3):
+            self.feed(turntable, 1)
+            turntable.identify(second)
+            self.assertTrue(self.events.empty())
+        self.feed(turntable, 1)
+        turntable.identify(3)
+        self.assertEqual(4, len(self.recognizer.fingerprinted))
+        event = self.events.get_nowait()
+        self.assertIsInstance(event, NewMetadata)
+        self.assertFalse(event.identified)
+        self.assertEqual("Unknown Artist - Unknown Album", event.title)
+        self.assertTrue(turntable.identified)
+        # A low-confidence guess mustn't pull its album into the cache.
+        self.assertEqual([], self.recognizer.remembered)
+
+    def test_queues_unconfident_sessions_for_ingestion(self):
+        ingest_queue: "queue.Queue" = queue.Queue()
+        turntable = self.turntable(
+            [0.1] * 4, fingerprint_min_seconds=5, ingest_queue=ingest_queue
+        )
+        turntable.session_capture = "session.wav"
+        self.feed(turntable, 5)
+        turntable.identify(0)
+        self.assertFalse(turntable.matched)
+        self.assertEqual("session.wav", ingest_queue.get_nowait())
+
+    def test_discontinuity_restarts_identification(self):
+        turntable = self.turntable([0.1, 0.1])
+        self.feed(turntable, 2)
+        turntable.identify(0)
+        self.feed(turntable, 1, discontinuity=True)
+        self.assertIsNone(turntable.identification)
+        turntable.identify(1)
+        self.feed(turntable, 1)
+        turntable.identify(2)
+        self.assertEqual([(2000, 0), (2000, 0)], self.recognizer.fingerprinted)
+        self.assertEqual(2000, turntable.identification.start)
+
+    def test_resumes_from_oldest_buffered_audio(self):
+        turntable = self.turntable([0.1, 0.1])
+        self.feed(turntable, 2)
+        turntable.identify(0)
+        self.feed(turntable, 12)
+        turntable.identify(1)
+        self.assertEqual([(2000, 0), (10000, 16)], self.recognizer.fingerprinted)
+
+    def test_rejects_short_sample_buffer(self):
+        with self.assertRaises(ValueError):
+            self.turntable([], sample_seconds=5)
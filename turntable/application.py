@@ -3,18 +3,28 @@ from contextlib import contextmanager
 import importlib.metadata
 import json
 import logging
-from multiprocessing import Process, Queue
+from multiprocessing import Process, Queue, current_process
 import os
 from typing import Any, Dict, Iterator, List, Optional
 
 from dejavu import Dejavu  # type: ignore
 
-from turntable.audio import Listener, Player
+from turntable import profiling
+from turntable.audio import Listener, Monitor, Player
 from turntable.events import Event, Exit
+from turntable.history import History
 from turntable.hue import Hue
 from turntable.icecast import Icecast
+from turntable.ingest import Ingester
 from turntable.models import PCM
-from turntable.turntable import Turntable
+from turntable.server import StatusServer
+from turntable.turntable import (
+    FingerprintWorker,
+    ParallelPCMRecognizer,
+    PCMRecognizer,
+    SongCache,
+    Turntable,
+)
 
 VERSION = importlib.metadata.version("turntable")
 logger = logging.getLogger(__name__)
@@ -41,27 +51,57 @@ class Application:
 
         audio_config = self.config.get("audio", dict())
         pcm_in: "Queue[PCM]" = Queue()
-        hue_pcm: "Queue[PCM]" = Queue()
-        pcms: "List[Queue[PCM]]" = [pcm_in, hue_pcm]
+        pcms: "List[Queue[PCM]]" = [pcm_in]
         if pcm:
             pcms.append(pcm)
-        if output_device := audio_config.get("output_device"):
-            pcm_out: "Queue[PCM]" = Queue()
-            player = Player(
-                pcm_out,
-                audio_config.get("output_device", "null"),
-                framerate=audio_config.get("framerate", 44100),
-                channels=audio_config.get("channels", 2),
-                period_size=audio_config.get("period_size", 4096),
+        server_config = self.config.get("server", dict())
+        self.server: Optional[StatusServer] = None
+        if server_config.get("enabled", False):
+            server_events: "Queue[Event]" = Queue()
+            server_pcm: "Queue[PCM]" = Queue()
+            self.server = StatusServer(
+                server_events,
+                server_pcm,
+                host=server_config.get("host", "0.0.0.0"),
+                port=server_config.get("port", 8080),
+                rate=server_config.get("rate", 20),
+                bands=server_config.get("bands", 16),
             )
-            self.processes.append(player)
-            pcms.append(pcm_out)
+            event_queues.append(server_events)
+            pcms.append(server_pcm)
+
+        monitor: Optional[Monitor] = None
+        if output_device := audio_config.get("output_device"):
+            if audio_config.get("output_passthrough", False):
+                monitor = Monitor(
+                    output_device,
+                    framerate=audio_config.get("framerate", 44100),
+                    channels=audio_config.get("channels", 2),
+                    period_size=audio_config.get("period_size", 4096),
+                    latency=audio_config.get("output_latency", 0.1),
+                    blocking=False,
+                )
+            else:
+                pcm_out: "Queue[PCM]" = Queue()
+                player = Player(
+                    pcm_out,
+                    output_device,
+                    framerate=audio_config.get("framerate", 44100),
+                    channels=audio_config.get("channels", 2),
+                    period_size=audio_config.get("period_size", 4096),
+                    latency=audio_config.get("output_latency", 0.1),
+                )
+                self.processes.append(player)
+                pcms.append(pcm_out)
         listener = Listener(
             pcms,
             audio_config.get("device", "default"),
             framerate=audio_config.get("framerate", 44100),
             channels=audio_config.get("channels", 2),
             period_size=audio_config.get("period_size", 4096),
+            monitor=monitor,
+            adaptive_period=audio_config.get("adaptive_period", False),
+            max_period_size=audio_config.get("max_period_size"),
         )
         self.processes.append(listener)
 
@@ -84,19 +124,85 @@ class Application:
         hue_enabled = hue_config.get("enabled", False)
         if hue_enabled:
             hue_events: "Queue[Event]" = Queue()
+            hue_pcm: "Queue[PCM]" = Queue()
             hue = Hue(
                 pcm_in=hue_pcm,
                 events=hue_events,
                 host=hue_config.get("host", "localhost"),
                 username=hue_config.get("username", "turntable"),
                 light=hue_config.get("light", "Light"),
+                group=hue_config.get("group"),
+                stream_host=hue_config.get("stream_host"),
+                stream_port=hue_config.get("stream_port", 2100),
+                stream_rate=hue_config.get("stream_rate", 25),
             )
             event_queues.append(hue_events)
+            pcms.append(hue_pcm)
             self.processes.append(hue)
 
+        history_config = self.config.get("history", dict())
+        if history_config.get("enabled", False):
+            history_path = os.path.expanduser(
+                history_config.get("path", "~/.local/share/turntable/history.db")
+            )
+            os.makedirs(os.path.dirname(history_path), exist_ok=True)
+            history_events: "Queue[Event]" = Queue()
+            history = History(
+                history_events,
+                history_path,
+                batch_size=history_config.get("batch_size", 16),
+                commit_interval=history_config.get("commit_interval", 60),
+            )
+            event_queues.append(history_events)
+            self.processes.append(history)
+
         dejavu = Dejavu(self.config.get("dejavu", dict()))
 
+        ingest_config = self.config.get("ingest", dict())
+        self.ingest_queue: "Queue[Optional[str]]" = Queue()
+        self.ingesters: List[Ingester] = []
+        if ingest_config.get("enabled", False):
+            for _ in range(ingest_config.get("workers", 1)):
+                ingester = Ingester(
+                    self.ingest_queue,
+                    [self.app_events],
+                    self.config.get("dejavu", dict()),
+                    batch_size=ingest_config.get("batch_size", 1000),
+                    niceness=ingest_config.get("nice", 19),
+                    duplicate_confidence=ingest_config.get("duplicate_confidence", 0.1),
+                )
+                self.ingesters.append(ingester)
+                self.processes.append(ingester)
+
+        self.profile_directory = self.config.get("profile", dict()).get(
+            "directory", "/tmp/turntable-profile"
+        )
+
         turntable_config = self.config.get("turntable", dict())
+        self.fingerprint_tasks: "Queue" = Queue()
+        self.fingerprint_workers: List[FingerprintWorker] = []
+        cache_size = turntable_config.get("cache_size", 0)
+        recognizer_options = dict(
+            cache=SongCache(cache_size) if cache_size else None,
+            cache_neighbours=turntable_config.get("cache_neighbours", 0),
+            cache_confidence=turntable_config.get("cache_confidence", 0.1),
+        )
+        recognizer = PCMRecognizer(dejavu, **recognizer_options)
+        if (workers := turntable_config.get("fingerprint_workers", 0)) >= 1:
+            fingerprint_results: "Queue" = Queue()
+            recognizer = ParallelPCMRecognizer(
+                dejavu,
+                self.fingerprint_tasks,
+                fingerprint_results,
+                workers,
+                overlap=turntable_config.get("fingerprint_overlap", 1.0),
+                **recognizer_options,
+            )
+            for _ in range(workers):
+                worker = FingerprintWorker(self.fingerprint_tasks, fingerprint_results)
+                self.fingerprint_workers.append(worker)
+                self.processes.append(worker)
+
         turntable = Turntable(
             pcm_in,
             self.app_events,
@@ -104,6 +210,7 @@ class Application:
             listener.framerate,
             listener.channels,
             dejavu,
+            recognizer=recognizer,
             fingerprint_delay=turntable_config.get("fingerprint_delay", 5),
             fingerprint_identify_delay=turntable_config.get(
                 "fingerprint_identify_delay", 5
@@ -111,12 +218,22 @@ class Application:
             fingerprint_identify_seconds=turntable_config.get(
                 "fingerprint_identify_seconds", 5
             ),
+            fingerprint_min_seconds=turntable_config.get("fingerprint_min_seconds", 2),
+            fingerprint_step_seconds=turntable_config.get(
+                "fingerprint_step_seconds", 1
+            ),
+            fingerprint_confidence=turntable_config.get("fingerprint_confidence", 0.1),
+            fingerprint_step_overlap=turntable_config.get(
+                "fingerprint_step_overlap", 1.0
+            ),
             fingerprint_store_path=turntable_config.get(
                 "fingerprint_store_path", "/tmp/fingerprint.wav"
             ),
             fingerprint_store_seconds=turntable_config.get(
                 "fingerprint_store_seconds", 30
             ),
+            ingest_queue=self.ingest_queue if self.ingesters else None,
+            ingest_path=ingest_config.get("path", "/tmp/turntable-sessions"),
             sample_seconds=turntable_config.get("sample_seconds", 30),
             silence_threshold=turntable_config.get("silence_threshold", 20),
             stop_delay=turntable_config.get("stop_delay", 5),
@@ -124,17 +241,34 @@ class Application:
         self.processes.append(turntable)
 
     def run(self) -> None:
+        profiling.install(self.profile_directory)
         for process in self.processes:
             logging.info("Starting %s", process)
             process.daemon = True
             process.start()
+        pids = {
+            process.name: process.pid
+            for process in self.processes
+            if process.pid is not None
+        }
+        pids[current_process().name] = os.getpid()
+        profiling.write_pids(self.profile_directory, pids)
+        if self.server:
+            self.server.start()
 
     def shutdown(self) -> None:
         logging.info("Telling processes to exit")
         self.app_events.put(Exit())
+        if self.server:
+            self.server.stop()
+        for _ in self.fingerprint_workers:
+            self.fingerprint_tasks.put(None)
+        for _ in self.ingesters:
+            self.ingest_queue.put(None)
         for process in self.processes:
             logging.debug("Waiting for %s to terminate", process)
             process.join(3)
             if process.is_alive():
                 logging.info("Killing process %s", process)
                 process.kill()
+        profiling.remove_pids(self.profile_directory)
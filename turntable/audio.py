@@ -3,11 +3,13 @@ import logging
 import math
 from multiprocessing import Process, Queue
 from multiprocessing.connection import Connection
-from typing import Deque, List, Tuple, Union
+import queue
+import time
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
 
 import alsaaudio  # type: ignore
 
-from turntable.models import PCM
+from turntable.models import PCM, JitterBuffer, LatencyTracker
 
 logger = logging.getLogger(__name__)
 
@@ -21,20 +23,39 @@ class Listener(Process):
         framerate: int = 44100,
         channels: int = 2,
         period_size: int = 1024,
+        monitor: "Optional[Monitor]" = None,
+        adaptive_period: bool = False,
+        max_period_size: Optional[int] = None,
+        xrun_threshold: int = 3,
+        xrun_window: float = 10.0,
+        lag_threshold: int = 32,
+        max_retry_delay: float = 5.0,
     ) -> None:
         super().__init__()
         logger.info(f"Initializing Listener using '{device}'")
         self.pcm_in = pcm_in
+        self.monitor = monitor
+        self.device = device
         self.framerate = framerate
         self.channels = channels
-        self.capture = alsaaudio.PCM(
-            device=device,
-            type=alsaaudio.PCM_CAPTURE,
-            format=alsaaudio.PCM_FORMAT_S16_LE,
-            periodsize=period_size,
-            rate=framerate,
-            channels=channels,
-        )
+        self.base_period_size = period_size
+        self.adaptive_period = adaptive_period
+        self.max_period_size = max_period_size or period_size * 4
+        self.xrun_threshold = xrun_threshold
+        self.xrun_window = xrun_window
+        self.lag_threshold = lag_threshold
+        self.max_retry_delay = max_retry_delay
+        self.xruns = 0
+        self.errors = 0
+        self.recent_xruns: Deque[float] = deque()
+        self.lagging = 0
+        # Each consumer queue's size after the last period, and when it was
+        # last seen being read from.
+        self.backlogs: Dict[int, Tuple[int, float]] = dict()
+        self.last_adjustment = time.monotonic()
+        self.discontinuity = False
+        self.sequence = 0
+        self.open(period_size)
         available_channels: List[int] = self.capture.getchannels()
         available_rates: Union[int, Tuple[int, int]] = self.capture.getrates()
         if channels not in available_channels:
@@ -51,18 +72,265 @@ class Listener(Process):
             period_size,
         )
 
+    def open(self, period_size: int) -> None:
+        self.period_size = period_size
+        self.capture = alsaaudio.PCM(
+            device=self.device,
+            type=alsaaudio.PCM_CAPTURE,
+            format=alsaaudio.PCM_FORMAT_S16_LE,
+            periodsize=period_size,
+            rate=self.framerate,
+            channels=self.channels,
+        )
+
+    def reopen(self, period_size: int) -> None:
+        logger.info(
+            "Reopening capture on '%s' [periodsize=%d]", self.device, period_size
+        )
+        self.capture.close()
+        delay = 0.1
+        while True:
+            try:
+                self.open(period_size)
+                break
+            except alsaaudio.ALSAAudioError as e:
+                # The device may be gone for a while (e.g. a USB interface
+                # being replugged); keep trying rather than letting the
+                # Listener die.
+                logger.warning(
+                    "Failed to open '%s', retrying in %.1fs: %s", self.device, delay, e
+                )
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+        self.discontinuity = True
+
     def run(self) -> None:
         logger.debug("Starting Listener")
         while True:
-            length, data = self.capture.read()
+            try:
+                length, data = self.capture.read()
+            except alsaaudio.ALSAAudioError as e:
+                # Anything other than an overrun, such as the device going away.
+                self.errors += 1
+                self.recover(f"{e} (errors={self.errors})")
+                self.reopen(self.period_size)
+                continue
             if length > 0:
-                pcm = PCM(self.framerate, self.channels, data)
+                pcm = PCM(
+                    self.framerate,
+                    self.channels,
+                    data,
+                    discontinuity=self.discontinuity,
+                    timestamp=time.monotonic() - length / self.framerate,
+                    sequence=self.sequence,
+                )
+                self.sequence += 1
+                self.discontinuity = False
+                if self.monitor:
+                    self.monitor.feed(data)
+                    self.monitor.play(length)
                 for queue in self.pcm_in:
                     queue.put(pcm)
+                if self.adaptive_period:
+                    self.adapt()
             else:
-                logger.warning(
-                    "Sampler error (length={}, bytes={})".format(length, len(data))
-                )
+                # alsaaudio only returns a negative length for an overrun
+                # (-EPIPE), and has already re-prepared the stream.
+                self.xruns += 1
+                self.recent_xruns.append(time.monotonic())
+                self.recover(f"overrun (length={length}, xruns={self.xruns})")
+
+    def recover(self, error: str) -> None:
+        """Account for audio lost to a failed read.
+
+        The next period is flagged as a discontinuity so consumers don't
+        treat the audio on both sides of the gap as continuous.
+        """
+        logger.warning("Sampler error: %s", error)
+        self.discontinuity = True
+        # Skip a sequence number so consumers also see the lost audio as a gap.
+        self.sequence += 1
+
+    def backlog(self, now: float) -> int:
+        """The longest queue among consumers that are still reading.
+
+        A queue that hasn't shrunk relative to the period just put on it for
+        a whole window has nobody reading it, and a bigger period won't help.
+        """
+        backlog = 0
+        for i, pcm_queue in enumerate(self.pcm_in):
+            try:
+                size = pcm_queue.qsize()
+            except (NotImplementedError, ValueError):
+                return 0
+            previous, read_at = self.backlogs.get(i, (size, now))
+            if size <= previous:
+                read_at = now
+            self.backlogs[i] = (size, read_at)
+            if now - read_at <= self.xrun_window:
+                backlog = max(backlog, size)
+        return backlog
+
+    def adapt(self, now: Optional[float] = None) -> None:
+        """Resize the capture period based on overruns and consumer lag.
+
+        Repeated overruns, or consumer queues backed up for a whole window,
+        double the period size (up to `max_period_size`); six quiet windows
+        halve it again, back towards the configured size.
+        """
+        now = now if now is not None else time.monotonic()
+        while self.recent_xruns and now - self.recent_xruns[0] > self.xrun_window:
+            self.recent_xruns.popleft()
+        backlog = self.backlog(now)
+        self.lagging = self.lagging + 1 if backlog > self.lag_threshold else 0
+
+        if (
+            len(self.recent_xruns) >= self.xrun_threshold
+            or self.lagging * self.period_size >= self.xrun_window * self.framerate
+        ):
+            if self.period_size < self.max_period_size:
+                self.recent_xruns.clear()
+                self.lagging = 0
+                self.last_adjustment = now
+                self.reopen(min(self.period_size * 2, self.max_period_size))
+        elif (
+            self.period_size > self.base_period_size
+            and not self.recent_xruns
+            and not self.lagging
+            and now - self.last_adjustment > self.xrun_window * 6
+        ):
+            self.last_adjustment = now
+            self.reopen(max(self.period_size // 2, self.base_period_size))
+
+
+class Monitor:
+    """Audio playback through a fixed-latency jitter buffer.
+
+    Audio passed to `feed` is held until `latency` seconds have accumulated,
+    and each call to `play` writes a period (or the given number of frames)
+    to the output device. In blocking mode the device paces the caller; in
+    non-blocking mode periods the device cannot accept are dropped and
+    counted, which keeps the capture loop from stalling when monitoring from
+    the Listener's own process.
+
+    Output errors never propagate to the caller: the device is reopened, and
+    if that fails too, playback is skipped until a retry `retry_interval`
+    seconds later, so a failing output can't stop capture.
+    """
+
+    def __init__(
+        self,
+        device: str,
+        framerate: int = 44100,
+        channels: int = 2,
+        period_size: int = 1024,
+        latency: float = 0.1,
+        blocking: bool = True,
+        retry_interval: float = 5.0,
+    ) -> None:
+        self.device = device
+        self.framerate = framerate
+        self.channels = channels
+        self.period_size = period_size
+        self.blocking = blocking
+        self.retry_interval = retry_interval
+        self.failed_at = 0.0
+        self.playback: Optional[alsaaudio.PCM] = None
+        self.open()
+        target = max(int(framerate * latency), period_size)
+        self.buffer = JitterBuffer(
+            framesize=channels * 2, target=target, limit=target + 2 * period_size
+        )
+        self.device_overruns = 0
+        self.device_errors = 0
+        self._reported: Dict[str, int] = self.stats()
+        logger.info(
+            "Monitor ready on '%s' [rate=%d, channels=%d, periodsize=%d, latency=%dms]",
+            device,
+            framerate,
+            channels,
+            period_size,
+            target * 1000 // framerate,
+        )
+
+    def open(self) -> None:
+        self.playback = alsaaudio.PCM(
+            device=self.device,
+            type=alsaaudio.PCM_PLAYBACK,
+            mode=alsaaudio.PCM_NORMAL if self.blocking else alsaaudio.PCM_NONBLOCK,
+            format=alsaaudio.PCM_FORMAT_S16_LE,
+            periodsize=self.period_size,
+            rate=self.framerate,
+            channels=self.channels,
+        )
+
+    def reopen(self) -> None:
+        if self.playback:
+            try:
+                self.playback.close()
+            except alsaaudio.ALSAAudioError:
+                ...
+            self.playback = None
+        try:
+            self.open()
+            logger.info("Reopened monitor on '%s'", self.device)
+        except alsaaudio.ALSAAudioError as e:
+            self.failed_at = time.monotonic()
+            logger.warning(
+                "Monitor on '%s' unavailable, retrying in %.0fs: %s",
+                self.device,
+                self.retry_interval,
+                e,
+            )
+
+    def feed(self, data: bytes) -> None:
+        # The capture period can grow past ours when the Listener adapts it;
+        # always leave room for two incoming chunks above the target.
+        frames = len(data) // self.buffer.framesize
+        self.buffer.limit = max(self.buffer.limit, self.buffer.target + 2 * frames)
+        self.buffer.put(data)
+
+    def play(self, frames: Optional[int] = None) -> bool:
+        """Write buffered audio to the device, returning whether it's open."""
+        frames = frames or self.period_size
+        data = self.buffer.get(frames)
+        if self.playback is None:
+            if time.monotonic() - self.failed_at < self.retry_interval:
+                return False
+            self.reopen()
+            if self.playback is None:
+                return False
+        try:
+            written = self.playback.write(data)
+        except alsaaudio.ALSAAudioError as e:
+            self.device_errors += 1
+            logger.warning("Monitor error on '%s': %s", self.device, e)
+            self.reopen()
+            self.report()
+            return False
+        if written < frames:
+            self.device_overruns += 1
+        self.report()
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "buffered": len(self.buffer),
+            "underruns": self.buffer.underruns,
+            "overruns": self.buffer.overruns,
+            "dropped": self.buffer.dropped,
+            "padded": self.buffer.padded,
+            "device_overruns": self.device_overruns,
+            "device_errors": self.device_errors,
+        }
+
+    def report(self) -> None:
+        stats = self.stats()
+        for key in ("underruns", "overruns", "device_overruns", "device_errors"):
+            if stats[key] != self._reported[key]:
+                logger.debug("Monitor %s: %s", self.device, stats)
+                self._reported = stats
+                break
 
 
 class Player(Process):
@@ -74,29 +342,38 @@ class Player(Process):
         framerate: int = 44100,
         channels: int = 2,
         period_size: int = 1024,
+        latency: float = 0.1,
     ) -> None:
         super().__init__()
         logger.info(f"Initializing Player using '{device}'")
         self.pcm_in = pcm_in
         self.framerate = framerate
         self.channels = channels
-        self.playback = alsaaudio.PCM(
-            device=device,
-            type=alsaaudio.PCM_PLAYBACK,
-            format=alsaaudio.PCM_FORMAT_S16_LE,
-            periodsize=period_size,
-            rate=framerate,
-            channels=channels,
-        )
-        logger.info(
-            "Player ready on '%s' [rate=%d, channels=%d, periodsize=%d]",
+        self.latency = LatencyTracker("Player")
+        self.monitor = Monitor(
             device,
-            framerate,
-            channels,
-            period_size,
+            framerate=framerate,
+            channels=channels,
+            period_size=period_size,
+            latency=latency,
         )
+        logger.info("Player ready on '%s'", device)
 
     def run(self) -> None:
         logger.debug("Starting Player")
-        while pcm := self.pcm_in.get():
-            self.playback.write(pcm.raw)
+        stopping = False
+        while not stopping:
+            try:
+                while True:
+                    pcm = self.pcm_in.get(False)
+                    if not pcm:
+                        stopping = True
+                        break
+                    self.latency.update(pcm)
+                    self.monitor.feed(pcm.raw)
+            except queue.Empty:
+                ...
+            if not self.monitor.play():
+                # Nothing is pacing the loop while the output is down.
+                time.sleep(self.monitor.period_size / self.framerate)
+        logger.info("Player stopped: %s", self.monitor.stats())
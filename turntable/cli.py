@@ -1,11 +1,101 @@
+import argparse
+from datetime import datetime
+import json
 import logging
 from multiprocessing import Queue
+import os
+import sys
+import time
+import tracemalloc
+from typing import List
 
+from turntable import profiling
 from turntable.application import Application
 from turntable.events import Event
+from turntable.history import HistoryStore
+
+
+def profile(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(prog="turntable-cli profile")
+    parser.add_argument(
+        "--config", default=os.path.expanduser("~/.config/turntable.json")
+    )
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--interval", type=float, default=0.01)
+    parser.add_argument("--tracemalloc", action="store_true")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+    with open(args.config, "r") as config_file:
+        config = json.load(config_file)
+    directory = config.get("profile", dict()).get("directory", "/tmp/turntable-profile")
+
+    started = time.time()
+    pids = profiling.request(
+        directory, args.duration, interval=args.interval, memory=args.tracemalloc
+    )
+    print(f"Profiling {len(pids)} processes for {args.duration:.0f}s")
+    # Leave the processes a moment to write their results.
+    time.sleep(args.duration + 2)
+    output = os.path.join(directory, time.strftime("profile-%Y%m%d-%H%M%S.folded"))
+    summary = profiling.collect(directory, pids, started, output)
+    for name, frames in summary.items():
+        total = sum(frames.values())
+        print(f"\n{name} ({total} samples)")
+        for frame, count in frames.most_common(args.top):
+            print(f"  {count / total:6.1%}  {frame}")
+        if args.tracemalloc:
+            snapshot_path = os.path.join(directory, f"{name}-{pids[name]}.tracemalloc")
+            if os.path.exists(snapshot_path):
+                snapshot = tracemalloc.Snapshot.load(snapshot_path)
+                for stat in snapshot.statistics("lineno")[: args.top]:
+                    print(f"  {stat}")
+    print(f"\nCombined profile written to {output}")
+
+
+def history(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(prog="turntable-cli history")
+    parser.add_argument(
+        "--config", default=os.path.expanduser("~/.config/turntable.json")
+    )
+    parser.add_argument("--since", type=datetime.fromisoformat)
+    parser.add_argument("--until", type=datetime.fromisoformat)
+    parser.add_argument(
+        "--top", type=int, help="list the most played titles instead of sessions"
+    )
+    args = parser.parse_args(argv)
+    with open(args.config, "r") as config_file:
+        config = json.load(config_file)
+    path = os.path.expanduser(
+        config.get("history", dict()).get("path", "~/.local/share/turntable/history.db")
+    )
+    since = args.since.timestamp() if args.since else None
+    until = args.until.timestamp() if args.until else None
+
+    store = HistoryStore(path)
+    try:
+        if args.top:
+            for title, plays in store.most_played(args.top, since=since, until=until):
+                print(f"{plays:6d}  {title}")
+            return
+        sessions = store.between(
+            since if since is not None else float("-inf"),
+            until if until is not None else float("inf"),
+        )
+        for session in sessions:
+            started = datetime.fromtimestamp(session.started)
+            minutes = (session.stopped - session.started) / 60
+            print(
+                f"{started:%Y-%m-%d %H:%M}  {minutes:5.1f}m  "
+                f"{session.title or '<Unidentified>'}"
+            )
+    finally:
+        store.close()
 
 
 def main() -> None:
+    commands = {"profile": profile, "history": history}
+    if command := commands.get(sys.argv[1] if sys.argv[1:] else ""):
+        return command(sys.argv[2:])
     events: "Queue[Event]" = Queue()
     app = Application(events)
     app.run()
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Optional
 
 
 class Event:
@@ -21,6 +22,18 @@ class StoppedPlaying(Event):
 @dataclass
 class NewMetadata(Event):
     title: str
+    # False when nothing matched confidently, and `title` is a placeholder.
+    identified: bool = True
+    # Match confidence, seconds from the start of playback until
+    # identification, and seconds spent fingerprinting and querying.
+    confidence: Optional[float] = None
+    identified_after: Optional[float] = None
+    recognition_time: Optional[float] = None
+
+
+@dataclass
+class FingerprintsUpdated(Event):
+    title: str
 
 
 class Exit(Event):
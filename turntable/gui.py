@@ -1,11 +1,13 @@
 from bisect import bisect
 from collections import deque
+from contextlib import contextmanager
 import logging
 from multiprocessing import Queue
 import os
 import queue
 from statistics import fmean
-from typing import Deque, Iterable, List, Optional, Tuple, Union
+import time
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 import numpy as np  # type: ignore
 import pygame  # type: ignore
@@ -31,6 +33,7 @@ class Plot:
         ],
         lines_color: Tuple[int, int, int] = (128, 128, 128),
         smoothing: int = 5,
+        line_spacing: int = 4,
     ) -> None:
         self.screen = screen
         self.x = x
@@ -40,9 +43,19 @@ class Plot:
         self.bars = bars
         self.bar_colors = bar_colors
         self.lines_color = lines_color
+        self.line_spacing = line_spacing
         self.audio = models.PCM(44100, 2)
         self.spectrums: Deque[np.array] = deque(maxlen=smoothing)
 
+    @property
+    def smoothing(self) -> int:
+        assert self.spectrums.maxlen is not None
+        return self.spectrums.maxlen
+
+    @smoothing.setter
+    def smoothing(self, value: int) -> None:
+        self.spectrums = deque(self.spectrums, maxlen=value)
+
     def spectrum(self) -> np.array:
         data = np.fromstring(self.audio.raw, dtype=np.int16)
         if len(data) == 0:
@@ -54,32 +67,36 @@ class Plot:
         dbfs = np.maximum(-100, dbfs) + 100
         return dbfs
 
-    def draw_lines(self) -> None:
-        data = self.spectrum()
-        if len(data) == 0:
+    def draw_lines(self, data: "Optional[np.ndarray]" = None) -> None:
+        spectrum = self.spectrum() if data is None else data
+        if len(spectrum) == 0:
             return
 
-        nlines = self.width // 4
-        data = np.mean(
-            np.reshape(data[: len(data) // nlines * nlines], (-1, len(data) // nlines)),
+        nlines = self.width // self.line_spacing
+        spectrum = np.mean(
+            np.reshape(
+                spectrum[: len(spectrum) // nlines * nlines],
+                (-1, len(spectrum) // nlines),
+            ),
             axis=1,
         )
-        lines = self.height * (data / 100)
+        lines = self.height * (spectrum / 100)
         for i, line in enumerate(lines):
             pygame.draw.line(
                 self.screen,
                 self.lines_color,
-                (self.x + i * 4, self.height),
-                (self.x + i * 4, self.height - int(line)),
+                (self.x + i * self.line_spacing, self.height),
+                (self.x + i * self.line_spacing, self.height - int(line)),
             )
 
-    def draw_bars(self) -> None:
-        data = self.spectrum()
-        if len(data) == 0:
+    def draw_bars(self, data: "Optional[np.ndarray]" = None) -> None:
+        spectrum = self.spectrum() if data is None else data
+        if len(spectrum) == 0:
             return
         fft = np.max(
             np.reshape(
-                data[: len(data) // self.bars * self.bars], (-1, len(data) // self.bars)
+                spectrum[: len(spectrum) // self.bars * self.bars],
+                (-1, len(spectrum) // self.bars),
             ),
             axis=1,
         )
@@ -108,13 +125,120 @@ class Plot:
                 )
 
 
+class FrameProfiler:
+    """Per-phase frame timing over a sliding window of recent frames."""
+
+    def __init__(self, window: int = 60) -> None:
+        self.window = window
+        self.phases: Dict[str, Deque[float]] = dict()
+        self.frames: Deque[float] = deque(maxlen=window)
+        self.current = 0.0
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.phases.setdefault(name, deque(maxlen=self.window)).append(elapsed)
+            self.current += elapsed
+
+    def end_frame(self) -> float:
+        """Close out the current frame, returning the time spent in its phases."""
+        elapsed, self.current = self.current, 0.0
+        self.frames.append(elapsed)
+        return elapsed
+
+    def frame_time(self) -> float:
+        return fmean(self.frames) if self.frames else 0.0
+
+    def summary(self) -> List[str]:
+        lines = [
+            f"{name}: {fmean(times) * 1000:.1f}ms"
+            for name, times in self.phases.items()
+        ]
+        lines.append(f"frame: {self.frame_time() * 1000:.1f}ms")
+        return lines
+
+    def draw(self, screen, font) -> None:
+        for i, line in enumerate(self.summary()):
+            text = font.render(line, True, (255, 255, 255))
+            screen.blit(text, (10, 10 + i * text.get_height()))
+
+
+class QualityController:
+    """Trade visual detail for frame rate when frames overrun their budget.
+
+    Each quality level is a tuple of (fps, line spacing, smoothing), ordered
+    from best to cheapest. After `window` frames the controller steps down a
+    level if the mean frame time exceeded the budget for the current frame
+    rate, or back up if it used less than `headroom` of the budget at the
+    better level.
+    """
+
+    def __init__(
+        self,
+        plot: Plot,
+        fps: int,
+        window: int = 60,
+        headroom: float = 0.6,
+    ) -> None:
+        self.plot = plot
+        self.window = window
+        self.headroom = headroom
+        self.levels = [
+            (fps, plot.line_spacing, plot.smoothing),
+            (fps, plot.line_spacing * 2, plot.smoothing),
+            (fps, plot.line_spacing * 4, max(1, plot.smoothing // 2)),
+            (max(1, fps * 3 // 4), plot.line_spacing * 4, max(1, plot.smoothing // 2)),
+            (max(1, fps // 2), plot.line_spacing * 8, 1),
+        ]
+        self.level = 0
+        self.frames = 0
+        self.apply()
+
+    @property
+    def fps(self) -> int:
+        return self.levels[self.level][0]
+
+    def apply(self) -> None:
+        _, self.plot.line_spacing, self.plot.smoothing = self.levels[self.level]
+
+    def update(self, frame_time: float) -> None:
+        self.frames += 1
+        if self.frames < self.window:
+            return
+        self.frames = 0
+        if frame_time > 1 / self.fps and self.level < len(self.levels) - 1:
+            self.level += 1
+        elif (
+            self.level > 0
+            and frame_time < self.headroom / self.levels[self.level - 1][0]
+        ):
+            self.level -= 1
+        else:
+            return
+        logger.debug(
+            "Frame time %.1fms, switching to quality level %d %s",
+            frame_time * 1000,
+            self.level,
+            self.levels[self.level],
+        )
+        self.apply()
+
+
 def main():
     event_queue: "Queue[events.Event]" = Queue()
     pcm_in: "Queue[models.PCM]" = Queue()
     app = application.Application(event_queue, pcm_in)
     config = app.config.get("gui", dict())
+    headless = config.get("headless", False)
     disp_no = os.getenv("DISPLAY")
-    if disp_no:
+    if headless:
+        logger.info("Running headless")
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+    elif disp_no:
         logger.info("I'm running under X display = {0}".format(disp_no))
 
     # Check which frame buffer drivers are available
@@ -137,6 +261,8 @@ def main():
         raise Exception("No suitable video driver found!")
 
     size = (pygame.display.Info().current_w, pygame.display.Info().current_h)
+    if headless:
+        size = (1280, 720)
     logger.info("Maximum size: %d x %d" % (size[0], size[1]))
     WIDTH = int(config.get("width", size[0]))
     HEIGHT = int(config.get("height", size[1]))
@@ -169,48 +295,73 @@ def main():
         lines_color=config.get("lines", (128, 128, 128)),
         smoothing=config.get("smoothing", 5),
     )
+    profiler = FrameProfiler()
+    show_profile = config.get("profile", False)
+    quality = QualityController(plot, FPS) if config.get("adaptive", True) else None
+    benchmark_frames = int(config.get("benchmark_frames", 0))
 
     try:
         app.run()
         clock = pygame.time.Clock()
+        latency = models.LatencyTracker("GUI")
         title = "<Idle>"
         stopping = False
+        frames = 0
         while not stopping:
             for event in pygame.event.get():
                 if event.type == QUIT or (
                     event.type == KEYDOWN and event.key == K_ESCAPE
                 ):
                     stopping = True
-            try:
-                while event := event_queue.get(False):
+                elif event.type == KEYDOWN and event.key == K_p:
+                    show_profile = not show_profile
+            with profiler.phase("queues"):
+                try:
+                    while event := event_queue.get(False):
+                        ...
+                        if isinstance(event, events.StartedPlaying):
+                            title = "<Starting...>"
+                        elif isinstance(event, events.StoppedPlaying):
+                            title = "<Idle>"
+                        elif isinstance(event, events.NewMetadata):
+                            title = event.title
+                        elif isinstance(event, events.Exit):
+                            stopping = True
+                except queue.Empty:
+                    ...
+                if stopping:
+                    break
+                try:
+                    while sample := pcm_in.get(False):
+                        latency.update(sample)
+                        plot.audio = sample
+                except queue.Empty:
                     ...
-                    if isinstance(event, events.StartedPlaying):
-                        title = "<Starting...>"
-                    elif isinstance(event, events.StoppedPlaying):
-                        title = "<Idle>"
-                    elif isinstance(event, events.NewMetadata):
-                        title = event.title
-                    elif isinstance(event, events.Exit):
-                        stopping = True
-            except queue.Empty:
-                ...
-            if stopping:
-                break
-            try:
-                while sample := pcm_in.get(False):
-                    plot.audio = sample
-            except queue.Empty:
-                ...
+            with profiler.phase("spectrum"):
+                spectrum = plot.spectrum()
             screen.fill((0, 0, 0))
-            plot.draw_lines()
-            plot.draw_bars()
-            title_text = font.render(title, True, (255, 255, 255))
-            title_rect = title_text.get_rect()
-            title_rect.left = 25
-            title_rect.centery = screen.get_height() - 25
-            screen.blit(title_text, title_rect)
-            pygame.display.update()
-            clock.tick(FPS)
+            with profiler.phase("lines"):
+                plot.draw_lines(spectrum)
+            with profiler.phase("bars"):
+                plot.draw_bars(spectrum)
+            with profiler.phase("text"):
+                title_text = font.render(title, True, (255, 255, 255))
+                title_rect = title_text.get_rect()
+                title_rect.left = 25
+                title_rect.centery = screen.get_height() - 25
+                screen.blit(title_text, title_rect)
+                if show_profile:
+                    profiler.draw(screen, font)
+            with profiler.phase("display"):
+                pygame.display.update()
+            profiler.end_frame()
+            if quality:
+                quality.update(profiler.frame_time())
+            frames += 1
+            if benchmark_frames and frames >= benchmark_frames:
+                logger.info("Benchmark: %d frames, %s", frames, profiler.summary())
+                stopping = True
+            clock.tick(quality.fps if quality else FPS)
     except:
         logger.exception("Shutting down")
     finally:
@@ -0,0 +1,184 @@
+from dataclasses import astuple, dataclass, fields
+import logging
+from multiprocessing import Process, Queue
+import queue
+import sqlite3
+import time
+from typing import List, Optional, Tuple
+
+from turntable.events import *
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    started REAL NOT NULL,
+    stopped REAL NOT NULL,
+    title TEXT,
+    confidence REAL,
+    identified_after REAL,
+    recognition_time REAL
+);
+CREATE INDEX IF NOT EXISTS sessions_started ON sessions (started);
+CREATE INDEX IF NOT EXISTS sessions_title ON sessions (title, started);
+CREATE TABLE IF NOT EXISTS title_counts (
+    title TEXT PRIMARY KEY,
+    plays INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS title_counts_plays ON title_counts (plays);
+"""
+
+
+@dataclass
+class Session:
+    """A single stretch of playback, with wall-clock start and stop times."""
+
+    started: float
+    stopped: float
+    title: Optional[str] = None
+    confidence: Optional[float] = None
+    identified_after: Optional[float] = None
+    recognition_time: Optional[float] = None
+
+
+class HistoryStore:
+    """Append-only SQLite store of play sessions.
+
+    Sessions are buffered in memory and written in a single transaction once
+    `batch_size` have accumulated or `commit_interval` seconds have passed
+    since the last commit, so a write-ahead log sync is paid per batch rather
+    than per session. Per-title play counts are kept in their own table in
+    the same transaction, so "most played" doesn't have to group the whole
+    history.
+    """
+
+    def __init__(
+        self, path: str, batch_size: int = 16, commit_interval: float = 60
+    ) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        self.pending: List[Session] = []
+        self.last_commit = time.monotonic()
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def append(self, session: Session) -> None:
+        self.pending.append(session)
+        if (
+            len(self.pending) >= self.batch_size
+            or time.monotonic() - self.last_commit >= self.commit_interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        self.last_commit = time.monotonic()
+        if not self.pending:
+            return
+        columns = ", ".join(field.name for field in fields(Session))
+        placeholders = ", ".join("?" for _ in fields(Session))
+        with self.db:
+            self.db.executemany(
+                f"INSERT INTO sessions ({columns}) VALUES ({placeholders})",
+                [astuple(session) for session in self.pending],
+            )
+            self.db.executemany(
+                "INSERT INTO title_counts (title, plays) VALUES (?, 1) "
+                "ON CONFLICT (title) DO UPDATE SET plays = plays + 1",
+                [(session.title,) for session in self.pending if session.title],
+            )
+        logger.debug("Wrote %d sessions to %s", len(self.pending), self.path)
+        self.pending = []
+
+    def between(self, start: float, end: float) -> List[Session]:
+        """Sessions that started between `start` and `end`, oldest first."""
+        self.flush()
+        cursor = self.db.execute(
+            "SELECT * FROM sessions WHERE started >= ? AND started < ? "
+            "ORDER BY started",
+            (start, end),
+        )
+        return [Session(*row) for row in cursor]
+
+    def most_played(
+        self,
+        limit: int = 10,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ) -> List[Tuple[str, int]]:
+        """The `limit` titles played most often, optionally within a range."""
+        self.flush()
+        if since is None and until is None:
+            cursor = self.db.execute(
+                "SELECT title, plays FROM title_counts "
+                "ORDER BY plays DESC, title LIMIT ?",
+                (limit,),
+            )
+        else:
+            cursor = self.db.execute(
+                "SELECT title, COUNT(*) AS plays FROM sessions "
+                "WHERE started >= ? AND started < ? AND title IS NOT NULL "
+                "GROUP BY title ORDER BY plays DESC, title LIMIT ?",
+                (
+                    since if since is not None else float("-inf"),
+                    until if until is not None else float("inf"),
+                    limit,
+                ),
+            )
+        return list(cursor)
+
+    def close(self) -> None:
+        self.flush()
+        self.db.close()
+
+
+class History(Process):
+    """Records play sessions from the event stream into a HistoryStore.
+
+    Sessions that weren't identified are stored without a title, so the
+    placeholder shown for them isn't counted as a song.
+    """
+
+    def __init__(
+        self,
+        events: "Queue[Event]",
+        path: str,
+        batch_size: int = 16,
+        commit_interval: float = 60,
+    ) -> None:
+        super().__init__()
+        self.events = events
+        self.path = path
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+
+    def run(self) -> None:
+        logger.debug("Starting History")
+        store = HistoryStore(
+            self.path, batch_size=self.batch_size, commit_interval=self.commit_interval
+        )
+        session: Optional[Session] = None
+        while True:
+            try:
+                event = self.events.get(timeout=self.commit_interval)
+            except queue.Empty:
+                store.flush()
+                continue
+            if isinstance(event, StartedPlaying):
+                now = time.time()
+                session = Session(started=now, stopped=now)
+            elif isinstance(event, NewMetadata) and session:
+                session.title = event.title if event.identified else None
+                session.confidence = event.confidence
+                session.identified_after = event.identified_after
+                session.recognition_time = event.recognition_time
+            elif isinstance(event, StoppedPlaying) and session:
+                session.stopped = time.time()
+                store.append(session)
+                session = None
+            elif isinstance(event, Exit):
+                break
+        store.close()
+        logger.info("History stopped")
@@ -3,13 +3,15 @@ import logging
 from multiprocessing import Process, Queue
 import os
 import queue
+import socket
+import struct
 import time
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import requests
 
 from turntable.events import *
-from turntable.models import PCM
+from turntable.models import PCM, LatencyTracker
 
 logger = logging.getLogger(__name__)
 
@@ -41,7 +43,59 @@ def hue_error(response: Any) -> Optional[str]:
         return None
 
 
+class HueStream:
+    """Entertainment API light frames sent as datagrams.
+
+    Each frame is a "HueStream" v1 message: a 16 byte header followed by up
+    to ten 9 byte light records (type, id, 16-bit red, green and blue). The
+    bridge only accepts these over DTLS, which the standard library can't
+    speak, so `sock` may be any connected datagram socket, such as a DTLS
+    wrapper. By default a plain UDP socket is used, which is only useful
+    pointed at a local DTLS proxy or stand-in, never at the bridge itself.
+    """
+
+    MAX_LIGHTS = 10
+
+    def __init__(
+        self, host: str, port: int = 2100, sock: Optional[socket.socket] = None
+    ) -> None:
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.connect((host, port))
+        self.sock = sock
+        self.sequence = 0
+
+    @staticmethod
+    def encode(sequence: int, lights: Dict[int, Tuple[int, int, int]]) -> bytes:
+        header = b"HueStream" + struct.pack(">BBBHBB", 1, 0, sequence & 0xFF, 0, 0, 0)
+        records = b"".join(
+            struct.pack(">BHHHH", 0, light, *rgb) for light, rgb in lights.items()
+        )
+        return header + records
+
+    def send(self, lights: Dict[int, Tuple[int, int, int]]) -> None:
+        items = list(lights.items())
+        for i in range(0, len(items), self.MAX_LIGHTS):
+            frame = HueStream.encode(
+                self.sequence, dict(items[i : i + self.MAX_LIGHTS])
+            )
+            self.sock.send(frame)
+        self.sequence = (self.sequence + 1) & 0xFF
+
+    def close(self) -> None:
+        self.sock.close()
+
+
 class Hue(Process):
+    """Drives lights from the audio level.
+
+    If `group` names an entertainment group and `stream_host` points at a
+    DTLS proxy for the bridge, levels are streamed to every light in the
+    group. Once the bridge has had `stream_check_delay` seconds to pick the
+    stream up, the group's stream state is checked; if it isn't active,
+    streaming is abandoned for the REST updates of the single `light`.
+    """
+
     def __init__(
         self,
         pcm_in: "Queue[PCM]",
@@ -49,6 +103,11 @@ class Hue(Process):
         host: str,
         username: str,
         light: str,
+        group: Optional[str] = None,
+        stream_host: Optional[str] = None,
+        stream_port: int = 2100,
+        stream_rate: float = 25,
+        stream_check_delay: float = 11,
     ):
         super().__init__()
         self.pcm_in = pcm_in
@@ -59,6 +118,48 @@ class Hue(Process):
         self.light_id = None
         self.light_state = dict()
         self.active = False
+        self.latency = LatencyTracker("Hue")
+        self.group = group
+        self.group_id: Optional[str] = None
+        self.group_lights: List[int] = []
+        self.stream_host = stream_host
+        self.stream_port = stream_port
+        self.stream_rate = stream_rate
+        self.stream_check_delay = stream_check_delay
+        self.stream: Optional[HueStream] = None
+        self.stream_started = 0.0
+        self.stream_verified = False
+
+        if group and stream_host in (None, host):
+            # Plain datagrams sent straight to the bridge are silently
+            # ignored, so never stream without a proxy in between.
+            logger.warn(
+                "Streaming to '%s' needs stream_host set to a DTLS proxy, "
+                "falling back to REST",
+                group,
+            )
+        elif group:
+            try:
+                groups = hue_response(
+                    requests.get(f"http://{self.host}/api/{self.username}/groups")
+                )
+                self.group_id, group_state = next(
+                    filter(
+                        lambda i: i[1].get("type") == "Entertainment"
+                        and i[1]["name"].lower() == group.lower(),
+                        groups.items(),
+                    )
+                )
+                self.group_lights = [int(light) for light in group_state["lights"]]
+                logger.info(
+                    "Streaming to entertainment group '%s' (lights %s)",
+                    group,
+                    self.group_lights,
+                )
+            except HueError as error:
+                logger.warn(f"Error fetching groups: %s", error)
+            except StopIteration:
+                logger.warn(f"Could not find an entertainment group named '%s'", group)
 
         try:
             lights = hue_response(
@@ -78,8 +179,94 @@ class Hue(Process):
             return
         logger.info("Hue ready")
 
+    def start_stream(self) -> None:
+        # Only reachable with a stream host; see __init__.
+        assert self.stream_host is not None
+        try:
+            hue_response(
+                requests.put(
+                    f"http://{self.host}/api/{self.username}/groups/{self.group_id}",
+                    json={"stream": {"active": True}},
+                )
+            )
+            self.stream = HueStream(self.stream_host, self.stream_port)
+            self.stream_started = time.monotonic()
+            logger.info("Started streaming to %s", self.group)
+        except (HueError, OSError) as e:
+            logger.warn(f"Error starting stream, falling back to REST: %s", e)
+            self.stream = None
+
+    def check_stream(self) -> None:
+        """Fall back to REST for good if the bridge isn't taking the stream.
+
+        UDP sends succeed whether or not anything is listening, so the only
+        sign of a broken stream is the bridge reporting it inactive.
+        """
+        self.stream_verified = True
+        try:
+            group = hue_response(
+                requests.get(
+                    f"http://{self.host}/api/{self.username}/groups/{self.group_id}"
+                )
+            )
+            active = group.get("stream", {}).get("active", False)
+        except HueError as e:
+            logger.warn(f"Error checking stream: %s", e)
+            active = False
+        if active:
+            logger.debug("Stream to %s is active", self.group)
+            return
+        logger.warn("Stream to %s is not active, falling back to REST", self.group)
+        self.stop_stream()
+        self.group_lights = []
+
+    def stop_stream(self) -> None:
+        if not self.stream:
+            return
+        self.stream.close()
+        self.stream = None
+        try:
+            hue_response(
+                requests.put(
+                    f"http://{self.host}/api/{self.username}/groups/{self.group_id}",
+                    json={"stream": {"active": False}},
+                )
+            )
+            logger.info("Stopped streaming to %s", self.group)
+        except HueError as e:
+            logger.warn(f"Error stopping stream: %s", e)
+
+    @staticmethod
+    def channel_peaks(audio: PCM) -> List[int]:
+        if audio.channels == 2:
+            return [
+                audioop.max(audioop.tomono(audio.raw, 2, 1, 0), 2),
+                audioop.max(audioop.tomono(audio.raw, 2, 0, 1), 2),
+            ]
+        return [audioop.max(audio.raw, 2)]
+
+    def stream_levels(self, audio: PCM, max_peak: int) -> None:
+        """Send one frame, driving alternate lights from each stereo channel."""
+        assert self.stream
+        peaks = Hue.channel_peaks(audio)
+        lights = dict()
+        for i, light in enumerate(self.group_lights):
+            level = min(int(peaks[i % len(peaks)] / max_peak * 0xFFFF), 0xFFFF)
+            lights[light] = (level, level, level)
+        try:
+            self.stream.send(lights)
+        except OSError as e:
+            logger.warn(f"Error streaming, falling back to REST: %s", e)
+            self.stop_stream()
+            return
+        if (
+            not self.stream_verified
+            and time.monotonic() - self.stream_started >= self.stream_check_delay
+        ):
+            self.check_stream()
+
     def run(self) -> None:
-        if not self.light_id:
+        if not self.light_id and not self.group_lights:
             logger.warn("No light identified, not starting Hue")
             return
         logger.debug("Starting Hue")
@@ -91,17 +278,21 @@ class Hue(Process):
                 while event := self.events.get(False):
                     if isinstance(event, StartedPlaying):
                         try:
-                            self.light_state = hue_response(
-                                requests.get(
-                                    f"http://{self.host}/api/{self.username}/lights/{self.light_id}"
+                            if self.light_id:
+                                self.light_state = hue_response(
+                                    requests.get(
+                                        f"http://{self.host}/api/{self.username}/lights/{self.light_id}"
+                                    )
                                 )
-                            )
-                            logger.debug("Stored light state")
+                                logger.debug("Stored light state")
                         except HueError as e:
                             logger.warn(f"Error loading current light state: %s", e)
                         self.active = True
+                        if self.group_lights:
+                            self.start_stream()
                     elif isinstance(event, StoppedPlaying):
                         self.active = False
+                        self.stop_stream()
                         original_brightness = self.light_state.get("state", {}).get(
                             "bri"
                         )
@@ -119,6 +310,7 @@ class Hue(Process):
                             except HueError as e:
                                 logger.warn(f"Error restoring light brightness: %s", e)
                     elif isinstance(event, Exit):
+                        self.stop_stream()
                         stopping = True
             except queue.Empty:
                 ...
@@ -126,10 +318,14 @@ class Hue(Process):
                 break
             try:
                 while sample := self.pcm_in.get(False):
+                    self.latency.update(sample)
                     audio = sample
             except queue.Empty:
                 ...
-            if audio and self.active:
+            if audio and self.active and self.stream:
+                max_peak = max(max(Hue.channel_peaks(audio)), max_peak)
+                self.stream_levels(audio, max_peak)
+            elif audio and self.active and self.light_id:
                 rms = audioop.rms(audio.raw, audio.channels)
                 peak = audioop.max(audio.raw, audio.channels)
                 max_peak = max(peak, max_peak)
@@ -141,5 +337,5 @@ class Hue(Process):
                     json={"bri": brightness, "transitiontime": 1},
                 )
 
-            time.sleep(0.1)
+            time.sleep(1 / self.stream_rate if self.stream else 0.1)
         logger.info("Hue stopped")
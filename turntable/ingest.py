@@ -0,0 +1,120 @@
+import logging
+from multiprocessing import Process, Queue
+import os
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+import wave
+
+from dejavu import Dejavu  # type: ignore
+import dejavu.config.settings  # type: ignore
+from dejavu.logic.decoder import unique_hash  # type: ignore
+import numpy as np  # type: ignore
+
+from turntable.events import *
+
+logger = logging.getLogger(__name__)
+
+
+def write_wave(path: str, framerate: int, channels: int, raw: bytes) -> None:
+    with wave.open(path, "wb") as wavfile:
+        wavfile.setsampwidth(2)
+        wavfile.setnchannels(channels)
+        wavfile.setframerate(framerate)
+        wavfile.writeframesraw(raw)
+
+
+class Ingester(Process):
+    """Low-priority worker adding captured sessions to the dejavu database.
+
+    Paths to captured WAV files arrive on `sessions`. Each file is
+    fingerprinted and matched against the database first; audio that already
+    matches a known song with at least `duplicate_confidence` is skipped.
+    New audio is stored as a song named after the file, with its hashes
+    inserted `batch_size` rows per transaction, and a FingerprintsUpdated
+    event is published so the recognizer picks it up without a restart.
+    Captures are deleted once handled, whether or not they were ingested, so
+    they never pile up on the card.
+    """
+
+    def __init__(
+        self,
+        sessions: "Queue[Optional[str]]",
+        events: "List[Queue[Event]]",
+        dejavu_config: Dict[str, Any],
+        batch_size: int = 1000,
+        niceness: int = 19,
+        duplicate_confidence: float = 0.1,
+    ) -> None:
+        super().__init__()
+        self.sessions = sessions
+        self.events = events
+        self.dejavu_config = dejavu_config
+        self.batch_size = batch_size
+        self.niceness = niceness
+        self.duplicate_confidence = duplicate_confidence
+
+    def run(self) -> None:
+        logger.debug("Starting Ingester")
+        os.nice(self.niceness)
+        # Connect from the worker process rather than sharing the parent's
+        # database connections across the fork.
+        self.dejavu = Dejavu(self.dejavu_config)
+        while path := self.sessions.get():
+            try:
+                self.ingest(path)
+            except Exception:
+                logger.exception("Failed to ingest %s", path)
+            finally:
+                if os.path.exists(path):
+                    os.remove(path)
+        logger.info("Ingester stopped")
+
+    def fingerprint(self, path: str) -> Set[Tuple[str, int]]:
+        with wave.open(path, "rb") as wavfile:
+            framerate = wavfile.getframerate()
+            channels = wavfile.getnchannels()
+            raw = wavfile.readframes(wavfile.getnframes())
+        samples = np.frombuffer(raw, dtype="<i2").reshape(-1, channels)
+        hashes: Set[Tuple[str, int]] = set()
+        for channel in range(channels):
+            fingerprints, _ = self.dejavu.generate_fingerprints(
+                samples[:, channel], Fs=framerate
+            )
+            hashes |= set(fingerprints)
+        return hashes
+
+    def ingest(self, path: str) -> None:
+        started = time.time()
+        name = os.path.splitext(os.path.basename(path))[0]
+        hashes = self.fingerprint(path)
+        if not hashes:
+            logger.info("No fingerprints found in %s, skipping", path)
+            return
+
+        matches, dedup_hashes, _ = self.dejavu.find_matches(hashes)
+        results = self.dejavu.align_matches(matches, dedup_hashes, len(hashes))
+        if (
+            results
+            and results[0][dejavu.config.settings.INPUT_CONFIDENCE]
+            >= self.duplicate_confidence
+        ):
+            logger.info(
+                "%s matches %s, skipping",
+                path,
+                results[0][dejavu.config.settings.SONG_NAME],
+            )
+            return
+
+        db = self.dejavu.db
+        song_id = db.insert_song(name, unique_hash(path), len(hashes))
+        db.insert_hashes(song_id, list(hashes), self.batch_size)
+        db.set_song_fingerprinted(song_id)
+        logger.info(
+            "Ingested %s as '%s' (%d hashes in %.1fs)",
+            path,
+            name,
+            len(hashes),
+            time.time() - started,
+        )
+        for queue in self.events:
+            queue.put(FingerprintsUpdated(name))
@@ -1,6 +1,10 @@
 from collections import deque
 from dataclasses import dataclass
-from typing import Deque, Iterable, Optional, Union
+import logging
+import time
+from typing import Deque, Dict, Iterable, Optional, Union
+
+logger = logging.getLogger(__name__)
 
 
 class PCM:
@@ -12,10 +16,23 @@ class PCM:
         channels: int,
         data: bytes = b"",
         maxlen: Optional[int] = None,
+        discontinuity: bool = False,
+        timestamp: Optional[float] = None,
+        sequence: Optional[int] = None,
     ):
         self.framerate = framerate
         self.channels = channels
+        # Set on the first period captured after audio was lost.
+        self.discontinuity = discontinuity
+        # Sequence number of the most recent captured period in this audio.
+        self.sequence = sequence
         self._data: Deque[int] = deque(data, maxlen)
+        # Monotonic capture time just past the last frame. Tracking the end
+        # rather than the start keeps it valid as a bounded buffer discards
+        # its oldest frames.
+        self._end: Optional[float] = (
+            timestamp + len(self) / framerate if timestamp is not None else None
+        )
 
     @property
     def raw(self):
@@ -26,27 +43,177 @@ class PCM:
         # Two bytes for each channel
         return self.channels * 2
 
+    @property
+    def timestamp(self) -> Optional[float]:
+        """Monotonic time at which the first frame was captured."""
+        if self._end is None:
+            return None
+        return self._end - len(self) / self.framerate
+
+    def age(self, now: Optional[float] = None) -> Optional[float]:
+        """Seconds since the most recent frame was captured."""
+        if self._end is None:
+            return None
+        return (now if now is not None else time.monotonic()) - self._end
+
+    def _offset(self, frame: int) -> Optional[float]:
+        timestamp = self.timestamp
+        if timestamp is None:
+            return None
+        return timestamp + frame / self.framerate
+
     def __getitem__(self, key: Union[int, slice]) -> "PCM":
         """Address raw data by frame."""
         if isinstance(key, int):
             start = key * self.framesize
             stop = start + self.framesize
-            return PCM(self.framerate, self.channels, self.raw[start:stop])
+            return PCM(
+                self.framerate,
+                self.channels,
+                self.raw[start:stop],
+                timestamp=self._offset(key + len(self) if key < 0 else key),
+                sequence=self.sequence,
+            )
         else:
             start = key.start * self.framesize if key.start is not None else None
             stop = key.stop * self.framesize if key.stop is not None else None
             step = key.step * self.framesize if key.step is not None else None
-            return PCM(self.framerate, self.channels, self.raw[start:stop:step])
+            return PCM(
+                self.framerate,
+                self.channels,
+                self.raw[start:stop:step],
+                timestamp=self._offset(key.indices(len(self))[0]),
+                sequence=self.sequence,
+            )
 
     def __iter__(self) -> "Iterable[PCM]":
         """Iterate over raw data by frame."""
-        for i in range(0, len(self._data), self.framesize):
-            yield PCM(self.framerate, self.channels, self.raw[i : i + self.framesize])
+        for frame, i in enumerate(range(0, len(self._data), self.framesize)):
+            yield PCM(
+                self.framerate,
+                self.channels,
+                self.raw[i : i + self.framesize],
+                timestamp=self._offset(frame),
+                sequence=self.sequence,
+            )
 
     def __len__(self) -> int:
         return len(self._data) // self.framesize
 
+    def clear(self) -> None:
+        self._data.clear()
+
     def append(self, other: "PCM") -> None:
         if other.framerate != self.framerate or other.channels != self.channels:
             raise ValueError("Cannot append incompatible PCM audio")
         self._data.extend(other._data)
+        self._end = other._end
+        self.sequence = other.sequence
+
+
+class LatencyTracker:
+    """Capture-to-consumer latency and gap statistics for a PCM stream.
+
+    Consumers call `update` with each period they receive. Latency is the age
+    of the newest frame at that moment; gaps are jumps in the capture sequence
+    numbers. Statistics are logged and reset every `interval` seconds.
+    """
+
+    def __init__(self, name: str, interval: float = 10.0) -> None:
+        self.name = name
+        self.interval = interval
+        self.last_sequence: Optional[int] = None
+        self.last: Optional[float] = None
+        self.reset(time.monotonic())
+
+    def reset(self, now: float) -> None:
+        self.started = now
+        self.count = 0
+        self.total = 0.0
+        self.minimum = float("inf")
+        self.maximum = 0.0
+        self.gaps = 0
+        self.missing = 0
+
+    def update(self, pcm: PCM, now: Optional[float] = None) -> int:
+        """Record a received period, returning the number of periods missed."""
+        now = now if now is not None else time.monotonic()
+        missing = 0
+        if pcm.sequence is not None:
+            if self.last_sequence is not None and pcm.sequence > self.last_sequence + 1:
+                missing = pcm.sequence - self.last_sequence - 1
+                self.gaps += 1
+                self.missing += missing
+            self.last_sequence = pcm.sequence
+        if (age := pcm.age(now)) is not None:
+            self.last = age
+            self.count += 1
+            self.total += age
+            self.minimum = min(self.minimum, age)
+            self.maximum = max(self.maximum, age)
+        if now - self.started >= self.interval:
+            logger.debug("%s latency: %s", self.name, self.stats())
+            self.reset(now)
+        return missing
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "last": self.last or 0.0,
+            "mean": self.total / self.count if self.count else 0.0,
+            "min": self.minimum if self.count else 0.0,
+            "max": self.maximum,
+            "gaps": self.gaps,
+            "missing": self.missing,
+        }
+
+
+class JitterBuffer:
+    """Fixed-latency FIFO of raw PCM frames.
+
+    Holds incoming audio until `target` frames are buffered, then releases it
+    in fixed-size reads. Reads that find the buffer short are padded with
+    silence (an underrun) and the buffer re-primes itself; writes that push it
+    past `limit` frames drop the oldest audio back down to `target` (an
+    overrun), so latency never drifts beyond the configured bounds.
+    """
+
+    def __init__(self, framesize: int, target: int, limit: Optional[int] = None):
+        self.framesize = framesize
+        self.target = target
+        self.limit = limit if limit is not None else 2 * target
+        self.primed = False
+        self.underruns = 0
+        self.overruns = 0
+        self.dropped = 0
+        self.padded = 0
+        self._data = bytearray()
+
+    def __len__(self) -> int:
+        return len(self._data) // self.framesize
+
+    def put(self, data: bytes) -> None:
+        self._data.extend(data)
+        if len(self) > self.limit:
+            excess = len(self) - self.target
+            del self._data[: excess * self.framesize]
+            self.overruns += 1
+            self.dropped += excess
+
+    def get(self, frames: int) -> bytes:
+        size = frames * self.framesize
+        if not self.primed:
+            if len(self) < self.target:
+                self.padded += frames
+                return bytes(size)
+            self.primed = True
+        if len(self._data) < size:
+            missing = size - len(self._data)
+            data = bytes(self._data) + bytes(missing)
+            self._data.clear()
+            self.underruns += 1
+            self.padded += missing // self.framesize
+            self.primed = False
+            return data
+        data = bytes(self._data[:size])
+        del self._data[:size]
+        return data
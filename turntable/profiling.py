@@ -0,0 +1,197 @@
+from collections import Counter
+import json
+import logging
+from multiprocessing import current_process
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from types import FrameType
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+REQUEST_FILE = "request.json"
+PIDS_FILE = "pids.json"
+
+
+def collapse(frame: Optional[FrameType]) -> str:
+    """Render a stack as a semicolon-separated line, outermost frame first."""
+    stack = []
+    while frame:
+        code = frame.f_code
+        stack.append(
+            f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        )
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+class SamplingProfiler(threading.Thread):
+    """Periodically samples the main thread's stack from a background thread.
+
+    Samples are counted as collapsed stacks and written, along with an
+    optional tracemalloc snapshot, to files in `directory` named after the
+    process once `duration` seconds have passed or `stop` is called.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        duration: float,
+        interval: float = 0.01,
+        memory: bool = False,
+    ) -> None:
+        super().__init__(daemon=True)
+        self.directory = directory
+        self.duration = duration
+        self.interval = interval
+        self.memory = memory
+        target = threading.main_thread().ident
+        # The main thread is always running by the time this is constructed.
+        assert target is not None
+        self.target = target
+        self.stacks: Dict[str, int] = Counter()
+        self.stopping = threading.Event()
+
+    @property
+    def basename(self) -> str:
+        return os.path.join(self.directory, f"{current_process().name}-{os.getpid()}")
+
+    def stop(self) -> None:
+        self.stopping.set()
+
+    def run(self) -> None:
+        logger.info("Profiling for %.0fs", self.duration)
+        if self.memory:
+            tracemalloc.start()
+        deadline = time.monotonic() + self.duration
+        while not self.stopping.wait(self.interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.target)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+        with open(self.basename + ".folded", "w") as folded:
+            for stack, count in self.stacks.items():
+                folded.write(f"{stack} {count}\n")
+        if self.memory:
+            tracemalloc.take_snapshot().dump(self.basename + ".tracemalloc")
+            tracemalloc.stop()
+        logger.info("Wrote profile to %s", self.basename)
+
+
+_profiler: Optional[SamplingProfiler] = None
+
+
+def install(directory: str) -> None:
+    """Start or stop profiling whenever this process receives SIGUSR1.
+
+    The profiling parameters are read from `request.json` in `directory`.
+    Installing the handler before component processes are forked lets every
+    one of them respond to it.
+    """
+
+    def handle(signum, frame) -> None:
+        global _profiler
+        if _profiler and _profiler.is_alive():
+            _profiler.stop()
+            return
+        try:
+            with open(os.path.join(directory, REQUEST_FILE)) as request_file:
+                request = json.load(request_file)
+        except (OSError, ValueError) as e:
+            logger.warning("Invalid profiling request: %s", e)
+            return
+        _profiler = SamplingProfiler(
+            directory,
+            duration=request.get("duration", 30),
+            interval=request.get("interval", 0.01),
+            memory=request.get("tracemalloc", False),
+        )
+        _profiler.start()
+
+    os.makedirs(directory, exist_ok=True)
+    signal.signal(signal.SIGUSR1, handle)
+
+
+def start_time(pid: int) -> Optional[str]:
+    """When `pid` started, in clock ticks since boot, if it's running.
+
+    Recorded alongside each PID so a process that has since reused it can
+    be told apart from the one that was profiled.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            # Skip past the command name, which may itself contain spaces.
+            return stat.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        return None
+
+
+def write_pids(directory: str, pids: Dict[str, int]) -> None:
+    with open(os.path.join(directory, PIDS_FILE), "w") as pids_file:
+        json.dump(
+            {name: [pid, start_time(pid)] for name, pid in pids.items()}, pids_file
+        )
+
+
+def remove_pids(directory: str) -> None:
+    try:
+        os.remove(os.path.join(directory, PIDS_FILE))
+    except FileNotFoundError:
+        ...
+
+
+def request(
+    directory: str, duration: float, interval: float = 0.01, memory: bool = False
+) -> Dict[str, int]:
+    """Ask every running turntable process to profile itself.
+
+    Returns the processes that were signalled. Processes that have exited,
+    or whose PID now belongs to something else, are skipped: SIGUSR1 would
+    kill anything that doesn't handle it.
+    """
+    with open(os.path.join(directory, PIDS_FILE)) as pids_file:
+        pids: Dict[str, List] = json.load(pids_file)
+    with open(os.path.join(directory, REQUEST_FILE), "w") as request_file:
+        json.dump(
+            {"duration": duration, "interval": interval, "tracemalloc": memory},
+            request_file,
+        )
+    signalled = dict()
+    for name, (pid, started) in pids.items():
+        if started is None or start_time(pid) != started:
+            logger.warning("Process %s (%d) is not running", name, pid)
+            continue
+        try:
+            os.kill(pid, signal.SIGUSR1)
+            signalled[name] = pid
+        except ProcessLookupError:
+            logger.warning("Process %s (%d) is not running", name, pid)
+    return signalled
+
+
+def collect(
+    directory: str, pids: Dict[str, int], since: float, output: str
+) -> Dict[str, Counter]:
+    """Merge per-process profiles written after `since` into one file.
+
+    Each stack is prefixed with its process name, so a flame graph of the
+    output has one tower per process. Returns the samples for each process,
+    counted by innermost frame.
+    """
+    summary: Dict[str, Counter] = dict()
+    with open(output, "w") as merged:
+        for name, pid in pids.items():
+            path = os.path.join(directory, f"{name}-{pid}.folded")
+            if not os.path.exists(path) or os.path.getmtime(path) < since:
+                logger.warning("No profile from %s (%d)", name, pid)
+                continue
+            summary[name] = Counter()
+            with open(path) as folded:
+                for line in folded:
+                    stack, count = line.rstrip("\n").rsplit(" ", 1)
+                    merged.write(f"{name};{stack} {count}\n")
+                    summary[name][stack.rsplit(";", 1)[-1]] += int(count)
+    return summary
@@ -0,0 +1,330 @@
+import asyncio
+import base64
+from dataclasses import dataclass
+import hashlib
+import json
+import logging
+from multiprocessing import Queue
+import queue
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np  # type: ignore
+
+from turntable.events import *
+from turntable.models import PCM, LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+CLOSE_PROTOCOL_ERROR = 1002
+CLOSE_TOO_BIG = 1009
+
+PAGE = b"""<!DOCTYPE html>
+<html>
+<head><title>Turntable</title></head>
+<body style="margin:0;background:#000;color:#fff;font-family:sans-serif">
+<canvas id="plot" style="width:100vw;height:90vh"></canvas>
+<div id="title" style="padding:0 1em">&lt;Idle&gt;</div>
+<script>
+const canvas = document.getElementById("plot");
+const title = document.getElementById("title");
+const ws = new WebSocket(`ws://${location.host}/ws${location.search}`);
+ws.binaryType = "arraybuffer";
+ws.onmessage = (message) => {
+  if (typeof message.data === "string") {
+    const event = JSON.parse(message.data);
+    if (event.type === "StartedPlaying") title.textContent = "<Starting...>";
+    if (event.type === "StoppedPlaying") title.textContent = "<Idle>";
+    if (event.type === "NewMetadata") title.textContent = event.title;
+    return;
+  }
+  const frame = new Uint8Array(message.data);
+  const bands = frame.subarray(2);
+  canvas.width = canvas.clientWidth;
+  canvas.height = canvas.clientHeight;
+  const ctx = canvas.getContext("2d");
+  const width = canvas.width / bands.length;
+  ctx.fillStyle = "#0f0";
+  bands.forEach((band, i) => {
+    const height = (band / 255) * canvas.height;
+    ctx.fillRect(i * width + 1, canvas.height - height, width - 2, height);
+  });
+};
+</script>
+</body>
+</html>
+"""
+
+
+def accept_key(key: str) -> str:
+    digest = hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()
+    return base64.b64encode(digest).decode()
+
+
+def encode_frame(opcode: int, payload: bytes) -> bytes:
+    """Encode a single unmasked, unfragmented server-to-client frame."""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack(">BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack(">BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack(">BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+def encode_event(event: Event) -> bytes:
+    message = {"type": event.type}
+    if isinstance(event, NewMetadata):
+        message["title"] = event.title
+    return encode_frame(OPCODE_TEXT, json.dumps(message).encode())
+
+
+def encode_levels(pcm: PCM, bands: int) -> bytes:
+    """Quantize a period of audio into a compact binary frame.
+
+    The payload is one byte each for the peak and RMS level, followed by one
+    byte per log-spaced frequency band, all scaled from 0-100 dBFS above the
+    noise floor to 0-255.
+    """
+    data = np.frombuffer(pcm.raw, dtype=np.int16)
+    if len(data) == 0:
+        return encode_frame(OPCODE_BINARY, bytes(2 + bands))
+    merged = np.mean(np.reshape(data, (-1, pcm.channels)), axis=1)
+    peak = np.max(np.abs(merged))
+    rms = np.sqrt(np.mean(merged**2))
+    fft = np.abs(np.fft.rfft(merged)) * 2 / (len(merged) * 2**15)
+    edges = np.unique(np.geomspace(1, len(fft), bands + 1).astype(int))
+    spectrum = np.array(
+        [np.max(fft[start:stop]) for start, stop in zip(edges, edges[1:])]
+    )
+    levels = np.concatenate([[peak / 2**15, rms / 2**15], spectrum])
+    dbfs = np.maximum(-100, 20 * np.log10(np.maximum(levels, 1e-10))) + 100
+    quantized = (dbfs * 255 / 100).astype(np.uint8).tobytes()
+    return encode_frame(OPCODE_BINARY, quantized.ljust(2 + bands, b"\0"))
+
+
+@dataclass(eq=False)
+class Client:
+    writer: asyncio.StreamWriter
+    interval: float
+    last_sent: float = 0.0
+    dropped: int = 0
+
+
+class StatusServer(threading.Thread):
+    """WebSocket server streaming state events and audio levels to browsers.
+
+    Runs an asyncio loop in a thread of the Application process. Each tick,
+    events and the newest audio period are encoded once and the same bytes
+    are written to every client. Clients may ask for a lower frame rate with
+    a `rate` query parameter. A client whose socket buffer is still above
+    `max_buffer` bytes has frames skipped, and is disconnected once it has
+    missed `max_dropped` frames in a row.
+    """
+
+    def __init__(
+        self,
+        events: "Queue[Event]",
+        pcm_in: "Queue[PCM]",
+        host: str = "0.0.0.0",
+        port: int = 8080,
+        rate: float = 20,
+        bands: int = 16,
+        max_buffer: int = 65536,
+        max_dropped: int = 100,
+    ) -> None:
+        super().__init__(daemon=True)
+        self.events = events
+        self.pcm_in = pcm_in
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.bands = bands
+        self.max_buffer = max_buffer
+        self.max_dropped = max_dropped
+        self.clients: Set[Client] = set()
+        self.latency = LatencyTracker("StatusServer")
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stopping: Optional[asyncio.Event] = None
+
+    def run(self) -> None:
+        logger.debug("Starting Status Server")
+        asyncio.run(self.serve())
+        logger.info("Status Server stopped")
+
+    def stop(self) -> None:
+        if self.loop and self.stopping:
+            self.loop.call_soon_threadsafe(self.stopping.set)
+
+    async def serve(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        logger.info("Status Server listening on %s:%d", self.host, self.port)
+        async with server:
+            broadcast = asyncio.create_task(self.broadcast())
+            await self.stopping.wait()
+            broadcast.cancel()
+        for client in list(self.clients):
+            client.writer.close()
+
+    async def broadcast(self) -> None:
+        audio: Optional[PCM] = None
+        while True:
+            frames: List[bytes] = []
+            try:
+                while event := self.events.get(False):
+                    frames.append(encode_event(event))
+            except queue.Empty:
+                ...
+            try:
+                while sample := self.pcm_in.get(False):
+                    self.latency.update(sample)
+                    audio = sample
+            except queue.Empty:
+                ...
+            if frames:
+                for client in list(self.clients):
+                    self.send(client, frames, reliable=True)
+            if audio is not None and self.clients:
+                levels = encode_levels(audio, self.bands)
+                now = time.monotonic()
+                # Allow half a tick of jitter so a client asking for the full
+                # rate isn't skipped every other tick.
+                slack = 0.5 / self.rate
+                for client in list(self.clients):
+                    if now - client.last_sent >= client.interval - slack:
+                        client.last_sent = now
+                        self.send(client, [levels])
+                audio = None
+            await asyncio.sleep(1 / self.rate)
+
+    def send(self, client: Client, frames: List[bytes], reliable=False) -> None:
+        """Queue frames for a client, skipping or dropping it if it's too slow.
+
+        State events are `reliable` and always queued; level frames are
+        skipped while the client still has more than `max_buffer` bytes
+        waiting to be sent.
+        """
+        transport = client.writer.transport
+        if not reliable and transport.get_write_buffer_size() > self.max_buffer:
+            client.dropped += 1
+            if client.dropped >= self.max_dropped:
+                logger.info("Disconnecting slow client %s", self.peer(client))
+                self.clients.discard(client)
+                transport.abort()
+            return
+        client.dropped = 0
+        for frame in frames:
+            client.writer.write(frame)
+
+    @staticmethod
+    def peer(client: Client) -> str:
+        return str(client.writer.get_extra_info("peername"))
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            writer.close()
+            return
+        lines = request.decode("latin-1").split("\r\n")
+        _, path, *_ = lines[0].split(" ") + ["", ""]
+        headers: Dict[str, str] = dict()
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+
+        url = urlparse(path)
+        if headers.get("upgrade", "").lower() != "websocket":
+            if url.path == "/":
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n"
+                    + f"Content-Length: {len(PAGE)}\r\n\r\n".encode()
+                    + PAGE
+                )
+            else:
+                writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+            await writer.drain()
+            writer.close()
+            return
+
+        try:
+            key = headers["sec-websocket-key"]
+            valid = (
+                len(base64.b64decode(key, validate=True)) == 16
+                and headers.get("sec-websocket-version") == "13"
+            )
+        except (KeyError, ValueError):
+            valid = False
+        if not valid:
+            writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+            await writer.drain()
+            writer.close()
+            return
+
+        accept = accept_key(key)
+        writer.write(
+            b"HTTP/1.1 101 Switching Protocols\r\n"
+            b"Upgrade: websocket\r\nConnection: Upgrade\r\n"
+            + f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+        )
+        try:
+            rate = min(float(parse_qs(url.query)["rate"][0]), self.rate)
+        except (KeyError, ValueError):
+            rate = self.rate
+        client = Client(writer, 1 / rate if rate > 0 else 1 / self.rate)
+        self.clients.add(client)
+        logger.info("Client connected: %s", self.peer(client))
+        try:
+            await self.receive(reader, client)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            ...
+        finally:
+            self.clients.discard(client)
+            writer.close()
+            logger.info("Client disconnected: %s", self.peer(client))
+
+    async def receive(self, reader: asyncio.StreamReader, client: Client) -> None:
+        """Read client frames, answering pings, until the client closes.
+
+        Browsers only ever send control frames here, which are limited to 125
+        bytes, so anything else closes the connection before its payload is
+        read.
+        """
+        while True:
+            first, second = await reader.readexactly(2)
+            opcode = first & 0x0F
+            length = second & 0x7F
+            if not opcode & 0x8:
+                self.close(client, CLOSE_PROTOCOL_ERROR)
+                return
+            if length > 125:
+                self.close(client, CLOSE_TOO_BIG)
+                return
+            mask = await reader.readexactly(4) if second & 0x80 else bytes(4)
+            payload = bytes(
+                b ^ mask[i % 4] for i, b in enumerate(await reader.readexactly(length))
+            )
+            if opcode == OPCODE_CLOSE:
+                client.writer.write(encode_frame(OPCODE_CLOSE, payload[:2]))
+                return
+            if opcode == OPCODE_PING:
+                client.writer.write(encode_frame(OPCODE_PONG, payload))
+
+    def close(self, client: Client, code: int) -> None:
+        logger.info("Closing client %s (%d)", self.peer(client), code)
+        client.writer.write(encode_frame(OPCODE_CLOSE, struct.pack(">H", code)))
@@ -1,9 +1,13 @@
 import audioop
+from collections import OrderedDict
 from dataclasses import dataclass
 import enum
+import heapq
+import itertools
 import logging
 from multiprocessing import Process, Queue
-from multiprocessing.connection import Connection
+from multiprocessing.connection import Connection, wait
+import os
 import queue
 import struct
 import time
@@ -13,10 +17,21 @@ import wave
 from dejavu import Dejavu  # type: ignore
 from dejavu.base_classes.base_recognizer import BaseRecognizer  # type: ignore
 import dejavu.config.settings  # type: ignore
+from dejavu.config.settings import (  # type: ignore
+    DEFAULT_FS,
+    DEFAULT_OVERLAP_RATIO,
+    DEFAULT_WINDOW_SIZE,
+    FIELD_HASH,
+    FIELD_OFFSET,
+    FIELD_SONG_ID,
+    FINGERPRINTS_TABLENAME,
+)
+import numpy as np  # type: ignore
 
 
 from turntable.events import *
-from turntable.models import PCM
+from turntable.ingest import write_wave
+from turntable.models import PCM, LatencyTracker
 
 logger = logging.getLogger(__name__)
 
@@ -27,7 +42,139 @@ class State(enum.Enum):
     silent = "silent"
 
 
+class Scheduler:
+    """Named deadline timers, kept in a heap ordered by deadline.
+
+    Scheduling a name that is already pending replaces it. Cancelled and
+    replaced entries stay in the heap and are skipped when they surface.
+    """
+
+    def __init__(self) -> None:
+        self.heap: List[Tuple[float, int, str]] = []
+        self.pending: Dict[str, Tuple[int, Callable[[float], None]]] = dict()
+        self.counter = itertools.count()
+
+    def schedule(
+        self, name: str, deadline: float, action: Callable[[float], None]
+    ) -> None:
+        entry = next(self.counter)
+        self.pending[name] = (entry, action)
+        heapq.heappush(self.heap, (deadline, entry, name))
+
+    def cancel(self, name: str) -> None:
+        self.pending.pop(name, None)
+
+    def _discard_stale(self) -> None:
+        while self.heap:
+            _, entry, name = self.heap[0]
+            if name in self.pending and self.pending[name][0] == entry:
+                break
+            heapq.heappop(self.heap)
+
+    def timeout(self, now: float) -> Optional[float]:
+        """Seconds until the next deadline, or None if nothing is pending."""
+        self._discard_stale()
+        if not self.heap:
+            return None
+        return max(0.0, self.heap[0][0] - now)
+
+    def run(self, now: float) -> None:
+        """Run every action whose deadline has passed."""
+        self._discard_stale()
+        while self.heap and self.heap[0][0] <= now:
+            _, _, name = heapq.heappop(self.heap)
+            _, action = self.pending.pop(name)
+            action(now)
+            self._discard_stale()
+
+
+class SongCache:
+    """Bounded LRU cache of the fingerprints of recently matched songs.
+
+    Each entry maps a song id to its database row and its fingerprints,
+    indexed by upper-case hex hash (as dejavu's databases return them) to the
+    offsets at which the hash occurs in the song.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.songs: "OrderedDict[int, Tuple[Dict[str, Any], Dict[str, List[int]]]]" = (
+            OrderedDict()
+        )
+
+    def __contains__(self, song_id: int) -> bool:
+        return song_id in self.songs
+
+    def __len__(self) -> int:
+        return len(self.songs)
+
+    def add(
+        self, song_id: int, song: Dict[str, Any], hashes: Dict[str, List[int]]
+    ) -> None:
+        self.songs[song_id] = (song, hashes)
+        self.songs.move_to_end(song_id)
+        while len(self.songs) > self.size:
+            self.songs.popitem(last=False)
+
+    def touch(self, song_id: int) -> None:
+        self.songs.move_to_end(song_id)
+
+    def song(self, song_id: int) -> Dict[str, Any]:
+        return self.songs[song_id][0]
+
+    def match(self, hashes: Set[Tuple[str, int]]) -> List[Tuple[int, int, int, int]]:
+        """Align sample hashes against every cached song.
+
+        Returns (song id, offset, hashes matched, aligned count) tuples for
+        each song with any matching hash, best aligned first, counting in
+        the same way as dejavu's database matching.
+        """
+        sample: Dict[str, List[int]] = dict()
+        for h, offset in hashes:
+            sample.setdefault(h.upper(), []).append(offset)
+        results = []
+        for song_id, (_, song_hashes) in self.songs.items():
+            matched = 0
+            offsets: Dict[int, int] = dict()
+            for h, sample_offsets in sample.items():
+                for song_offset in song_hashes.get(h, ()):
+                    matched += 1
+                    for sample_offset in sample_offsets:
+                        difference = song_offset - sample_offset
+                        offsets[difference] = offsets.get(difference, 0) + 1
+            if offsets:
+                offset, count = max(offsets.items(), key=lambda item: item[1])
+                results.append((song_id, offset, matched, count))
+        return sorted(results, key=lambda result: result[3], reverse=True)
+
+
 class PCMRecognizer(BaseRecognizer):
+    # Audio samples per spectrogram frame, the unit of fingerprint offsets.
+    hop = int(DEFAULT_WINDOW_SIZE * (1 - DEFAULT_OVERLAP_RATIO))
+
+    def __init__(
+        self,
+        dejavu: Dejavu,
+        cache: Optional[SongCache] = None,
+        cache_neighbours: int = 0,
+        cache_confidence: float = 0.1,
+    ) -> None:
+        super().__init__(dejavu)
+        self.cache = cache
+        if cache is not None and 2 * cache_neighbours + 1 > cache.size:
+            # Loading more neighbours than fit would evict the ones just loaded.
+            logger.warning(
+                "Cache of %d songs can't hold %d neighbours either side of a match",
+                cache.size,
+                cache_neighbours,
+            )
+            cache_neighbours = (cache.size - 1) // 2
+        self.cache_neighbours = cache_neighbours
+        self.cache_confidence = cache_confidence
+        self.neighbours: List[int] = []
+        self.cache_hits = 0
+        self.cache_misses = 0
+
     @staticmethod
     def pcm_to_channel_data(pcm: PCM) -> List[List[int]]:
         def to_ints(data: bytes) -> List[int]:
@@ -36,10 +183,158 @@ class PCMRecognizer(BaseRecognizer):
         stream = to_ints(pcm.raw)
         return [stream[channel :: pcm.channels] for channel in range(pcm.channels)]
 
+    def fingerprint(
+        self, pcm: PCM, offset: int = 0
+    ) -> Tuple[Set[Tuple[str, int]], float]:
+        """Fingerprint every channel of `pcm` into a single set of hashes.
+
+        Hash offsets are shifted by `offset` spectrogram frames, so that
+        fingerprints of consecutive pieces of audio can be combined.
+        """
+        hashes: Set[Tuple[str, int]] = set()
+        fingerprint_time = 0.0
+        for channel in PCMRecognizer.pcm_to_channel_data(pcm):
+            fingerprints, t = self.dejavu.generate_fingerprints(channel, Fs=self.Fs)
+            hashes |= {(h, int(o) + offset) for h, o in fingerprints}
+            fingerprint_time += t
+        return hashes, fingerprint_time
+
+    def match(self, hashes: Set[Tuple[str, int]]) -> Tuple[List[Any], float, float]:
+        """Look up fingerprint hashes, returning (results, query time, align time).
+
+        Songs in the cache are tried first; the database is only queried if
+        none of them matches with at least `cache_confidence`.
+        """
+        if self.cache and hashes:
+            t = time.time()
+            results = self.match_cached(hashes)
+            if (
+                results
+                and results[0][dejavu.config.settings.INPUT_CONFIDENCE]
+                >= self.cache_confidence
+            ):
+                self.cache_hits += 1
+                self.cache.touch(results[0][dejavu.config.settings.SONG_ID])
+                self.report_cache()
+                return results, 0.0, time.time() - t
+            self.cache_misses += 1
+            self.report_cache()
+        matches, dedup_hashes, query_time = self.dejavu.find_matches(hashes)
+        t = time.time()
+        results = self.dejavu.align_matches(matches, dedup_hashes, len(hashes))
+        return results, query_time, time.time() - t
+
+    def match_cached(self, hashes: Set[Tuple[str, int]]) -> List[Dict[str, Any]]:
+        """Match against cached songs, with results shaped like dejavu's."""
+        assert self.cache
+        results = []
+        for song_id, offset, matched, _ in self.cache.match(hashes)[
+            : dejavu.config.settings.TOPN
+        ]:
+            song = self.cache.song(song_id)
+            total_hashes = song.get(dejavu.config.settings.FIELD_TOTAL_HASHES) or 1
+            results.append(
+                {
+                    dejavu.config.settings.SONG_ID: song_id,
+                    dejavu.config.settings.SONG_NAME: song.get(
+                        dejavu.config.settings.SONG_NAME, ""
+                    ).encode("utf8"),
+                    dejavu.config.settings.INPUT_HASHES: len(hashes),
+                    dejavu.config.settings.FINGERPRINTED_HASHES: total_hashes,
+                    dejavu.config.settings.HASHES_MATCHED_IN_INPUT: matched,
+                    dejavu.config.settings.INPUT_CONFIDENCE: round(
+                        matched / len(hashes), 2
+                    ),
+                    dejavu.config.settings.FINGERPRINTED_CONFIDENCE: round(
+                        matched / total_hashes, 2
+                    ),
+                    dejavu.config.settings.OFFSET: offset,
+                    dejavu.config.settings.OFFSET_SECS: round(
+                        offset * self.hop / DEFAULT_FS, 5
+                    ),
+                }
+            )
+        return results
+
+    def report_cache(self) -> None:
+        total = self.cache_hits + self.cache_misses
+        logger.info(
+            "Fingerprint cache hit rate: %.0f%% (%d of %d)",
+            100 * self.cache_hits / total,
+            self.cache_hits,
+            total,
+        )
+
+    def remember(self, song_id: int) -> None:
+        """Cache a matched song's fingerprints, and queue its album neighbours.
+
+        Songs fingerprinted together (such as an album's directory) get
+        consecutive ids, so the ids on either side of a match are the best
+        available guess at the rest of the record. Neighbours are loaded one
+        at a time by `load_neighbour`, nearest first.
+        """
+        if self.cache is None:
+            return
+        self.load(song_id)
+        self.neighbours = sorted(
+            (
+                neighbour
+                for neighbour in range(
+                    song_id - self.cache_neighbours,
+                    song_id + self.cache_neighbours + 1,
+                )
+                if neighbour != song_id
+            ),
+            key=lambda neighbour: abs(neighbour - song_id),
+        )
+
+    def load(self, song_id: int) -> None:
+        assert self.cache is not None
+        if song_id in self.cache:
+            self.cache.touch(song_id)
+            return
+        song = self.dejavu.db.get_song_by_id(song_id)
+        if song:
+            self.cache.add(song_id, song, self.song_hashes(song_id))
+
+    def load_neighbour(self) -> bool:
+        """Cache the next queued neighbour, returning whether any remain."""
+        if self.neighbours:
+            assert self.cache is not None
+            self.load(self.neighbours.pop(0))
+            if not self.neighbours:
+                logger.debug("Cached fingerprints for %d songs", len(self.cache))
+        return bool(self.neighbours)
+
+    def song_hashes(self, song_id: int) -> Dict[str, List[int]]:
+        if self.dejavu.config.get("database_type", "mysql") == "postgres":
+            query = (
+                f'SELECT upper(encode("{FIELD_HASH}", \'hex\')), "{FIELD_OFFSET}"'
+                f' FROM "{FINGERPRINTS_TABLENAME}" WHERE "{FIELD_SONG_ID}" = %s;'
+            )
+        else:
+            query = (
+                f"SELECT HEX(`{FIELD_HASH}`), `{FIELD_OFFSET}`"
+                f" FROM `{FINGERPRINTS_TABLENAME}` WHERE `{FIELD_SONG_ID}` = %s;"
+            )
+        hashes: Dict[str, List[int]] = dict()
+        with self.dejavu.db.cursor() as cur:
+            cur.execute(query, (song_id,))
+            for h, offset in cur:
+                hashes.setdefault(h, []).append(offset)
+        return hashes
+
+    def refresh(self) -> None:
+        """Reload dejavu's list of fingerprinted songs after new ingestion."""
+        self.dejavu.songs = self.dejavu.db.get_songs()
+        self.dejavu.songhashes_set = {
+            song[dejavu.config.settings.FIELD_FILE_SHA1] for song in self.dejavu.songs
+        }
+
     def recognize(self, pcm: PCM) -> Dict[str, Any]:
-        data = PCMRecognizer.pcm_to_channel_data(pcm)
         t = time.time()
-        matches, fingerprint_time, query_time, align_time = self._recognize(*data)
+        hashes, fingerprint_time = self.fingerprint(pcm)
+        matches, query_time, align_time = self.match(hashes)
         t = time.time() - t
         return {
             dejavu.config.settings.TOTAL_TIME: t,
@@ -50,6 +345,131 @@ class PCMRecognizer(BaseRecognizer):
         }
 
 
+class FingerprintWorker(Process):
+    """Fingerprints windows of single-channel audio for ParallelPCMRecognizer.
+
+    Tasks are (job, index, samples, offset, Fs) tuples. Each result carries
+    the job and index, the window's hashes with their offsets shifted by
+    `offset` spectrogram frames, and the time spent fingerprinting.
+    """
+
+    def __init__(self, tasks: "Queue", results: "Queue") -> None:
+        super().__init__()
+        self.tasks = tasks
+        self.results = results
+
+    def run(self) -> None:
+        logger.debug("Starting Fingerprint Worker")
+        while task := self.tasks.get():
+            job, index, samples, offset, fs = task
+            fingerprints, t = Dejavu.generate_fingerprints(samples, Fs=fs)
+            hashes = [(h, int(o) + offset) for h, o in fingerprints]
+            self.results.put((job, index, hashes, t))
+        logger.info("Fingerprint Worker stopped")
+
+
+class ParallelPCMRecognizer(PCMRecognizer):
+    """Fingerprints audio across a pool of FingerprintWorker processes.
+
+    Each channel is split into overlapping windows, aligned to the
+    spectrogram hop so that window offsets translate exactly into hash
+    offsets. The overlap lets peaks near a window boundary pair with their
+    neighbours in the next window; duplicate hashes from the overlap collapse
+    when the sets are merged.
+    """
+
+    def __init__(
+        self,
+        dejavu: Dejavu,
+        tasks: "Queue",
+        results: "Queue",
+        workers: int,
+        overlap: float = 1.0,
+        timeout: float = 30.0,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(dejavu, **kwargs)
+        self.tasks = tasks
+        self.results = results
+        self.workers = workers
+        self.overlap = overlap
+        self.timeout = timeout
+        self.job = 0
+        self.speedup = 1.0
+
+    def windows(self, length: int, count: int, framerate: int) -> List[Tuple[int, int]]:
+        step = -(-length // count)
+        step = -(-step // self.hop) * self.hop
+        overlap = int(self.overlap * framerate)
+        return [
+            (start, min(start + step + overlap, length))
+            for start in range(0, length, step)
+        ]
+
+    def fingerprint(
+        self, pcm: PCM, offset: int = 0
+    ) -> Tuple[Set[Tuple[str, int]], float]:
+        started = time.time()
+        self.job += 1
+        samples = np.frombuffer(pcm.raw, dtype="<i2").reshape(-1, pcm.channels)
+        count = -(-self.workers // pcm.channels)
+        tasks = 0
+        for channel in range(pcm.channels):
+            data = np.ascontiguousarray(samples[:, channel])
+            for start, stop in self.windows(len(data), count, pcm.framerate):
+                self.tasks.put(
+                    (
+                        self.job,
+                        tasks,
+                        data[start:stop],
+                        offset + start // self.hop,
+                        self.Fs,
+                    )
+                )
+                tasks += 1
+
+        hashes: Set[Tuple[str, int]] = set()
+        fingerprint_time = 0.0
+        received = 0
+        while received < tasks:
+            try:
+                job, _, fingerprints, t = self.results.get(timeout=self.timeout)
+            except queue.Empty:
+                logger.warning("Fingerprint workers timed out, falling back to serial")
+                return super().fingerprint(pcm, offset)
+            if job != self.job:
+                continue
+            hashes |= set(fingerprints)
+            fingerprint_time += t
+            received += 1
+
+        elapsed = time.time() - started
+        self.speedup = fingerprint_time / elapsed if elapsed else 1.0
+        logger.debug(
+            "Fingerprinted %d windows in %.2fs (%.2fs serial, %.1fx speedup)",
+            tasks,
+            elapsed,
+            fingerprint_time,
+            self.speedup,
+        )
+        return hashes, elapsed
+
+
+@dataclass
+class Identification:
+    """Progress of an identification extended over a growing window.
+
+    `start` and `end` are absolute frame positions in the captured stream;
+    `hashes` holds every fingerprint computed between them, with offsets
+    relative to `start`.
+    """
+
+    start: int
+    end: int
+    hashes: Set[Tuple[str, int]]
+    elapsed: float = 0.0
+
+
 class Turntable(Process):
     def __init__(
         self,
@@ -59,59 +479,124 @@ class Turntable(Process):
         framerate: int,
         channels: int,
         dejavu: Dejavu,
+        recognizer: Optional[PCMRecognizer] = None,
         fingerprint_delay: int = 5,
         fingerprint_identify_delay: int = 5,
         fingerprint_identify_seconds: int = 5,
+        fingerprint_min_seconds: float = 2,
+        fingerprint_step_seconds: float = 1,
+        fingerprint_confidence: float = 0.1,
+        fingerprint_step_overlap: float = 1.0,
         fingerprint_store_path: str = "/tmp/fingerprint.wav",
         fingerprint_store_seconds: int = 30,
+        ingest_queue: "Optional[Queue[Optional[str]]]" = None,
+        ingest_path: str = "/tmp/turntable-sessions",
         sample_seconds: int = 30,
         silence_threshold: int = 20,
         stop_delay: int = 5,
     ) -> None:
         super().__init__()
+        if sample_seconds < fingerprint_identify_seconds + fingerprint_step_overlap:
+            raise ValueError(
+                f"Sample buffer ({sample_seconds}s) is too short to identify from "
+                f"{fingerprint_identify_seconds}s of audio plus "
+                f"{fingerprint_step_overlap}s of overlap"
+            )
         maxlen = channels * 2 * framerate * sample_seconds
         self.buffer = PCM(framerate=framerate, channels=channels, maxlen=maxlen)
-        self.recognizer = PCMRecognizer(dejavu)
+        self.recognizer = recognizer or PCMRecognizer(dejavu)
         self.pcm_in = pcm_in
+        self.latency = LatencyTracker("Turntable")
         self.events_in = events_in
         self.events_out = events_out
         self.state: State = State.idle
         self.identified = False
         self.captured = False
-        self.last_update: float = time.time()
+        self.last_update: float = time.monotonic()
+        self.started_at: float = self.last_update
+        self.scheduler = Scheduler()
         self.fingerprint_delay = fingerprint_delay
         self.fingerprint_identify_delay = fingerprint_identify_delay
         self.fingerprint_identify_seconds = fingerprint_identify_seconds
+        self.fingerprint_min_seconds = min(
+            fingerprint_min_seconds, fingerprint_identify_seconds
+        )
+        self.fingerprint_step_seconds = fingerprint_step_seconds
+        self.fingerprint_confidence = fingerprint_confidence
+        self.fingerprint_step_overlap = fingerprint_step_overlap
+        self.frames = 0
+        self.identification: Optional[Identification] = None
         self.fingerprint_store_path = fingerprint_store_path
         self.fingerprint_store_seconds = fingerprint_store_seconds
+        self.ingest_queue = ingest_queue
+        self.ingest_path = ingest_path
+        self.matched = False
+        self.session_capture: Optional[str] = None
         self.silence_threshold = silence_threshold
         self.stop_delay = stop_delay
         logger.info("Turntable ready")
 
     def run(self) -> None:
         logger.debug("Starting Turntable")
+        events_reader = self.events_in._reader  # type: ignore
+        pcm_reader = self.pcm_in._reader  # type: ignore
         while True:
-            try:
-                event = self.events_in.get(block=False)
-                if isinstance(event, Exit):
-                    self.publish(StoppedPlaying())
-                    self.publish(event)
-                    break
-            except queue.Empty:
-                ...
-            fragment = self.pcm_in.get()
-            self.buffer.append(fragment)
-            maximum = audioop.max(fragment.raw, 2)
-            self.update_audiolevel(maximum)
+            ready = wait(
+                [events_reader, pcm_reader], self.scheduler.timeout(time.monotonic())
+            )
+            if events_reader in ready:
+                try:
+                    event = self.events_in.get(block=False)
+                    if isinstance(event, Exit):
+                        self.publish(StoppedPlaying())
+                        self.publish(event)
+                        break
+                    elif isinstance(event, FingerprintsUpdated):
+                        self.recognizer.refresh()
+                        self.publish(event)
+                except queue.Empty:
+                    ...
+            if pcm_reader in ready:
+                try:
+                    self.update_audio(self.pcm_in.get(block=False))
+                except queue.Empty:
+                    ...
+            self.scheduler.run(time.monotonic())
         logger.info("Turntable stopped")
 
+    def update_audio(self, fragment: PCM) -> None:
+        missing = self.latency.update(fragment)
+        if fragment.discontinuity or missing:
+            # Don't let fingerprints span audio spliced across a gap.
+            logger.debug("Capture discontinuity, discarding buffered audio")
+            self.buffer.clear()
+            self.identification = None
+        self.buffer.append(fragment)
+        self.frames += len(fragment)
+        maximum = audioop.max(fragment.raw, 2)
+        self.update_audiolevel(maximum)
+
     def publish(self, event: Event) -> None:
         for queue in self.events_out:
             queue.put(event)
 
+    def buffered(self, seconds: float) -> bool:
+        return len(self.buffer) >= self.buffer.framerate * seconds
+
+    def wait_for_audio(
+        self, seconds: float, name: str, action: Callable[[float], None]
+    ) -> bool:
+        """Reschedule `action` if fewer than `seconds` of audio are buffered."""
+        if self.buffered(seconds):
+            return False
+        missing = self.buffer.framerate * seconds - len(self.buffer)
+        self.scheduler.schedule(
+            name, time.monotonic() + missing / self.buffer.framerate, action
+        )
+        return True
+
     def update_audiolevel(self, level: int) -> None:
-        newstate = self.state
-        now = time.time()
+        now = time.monotonic()
         if self.state == State.idle:
             # Transition to playing if there's sufficient audio.
             if level > self.silence_threshold:
@@ -120,46 +605,146 @@ class Turntable(Process):
             # Transition to silent when the audio drops out.
             if level <= self.silence_threshold:
                 self.transition(State.silent, now)
-            elif (
-                now - self.last_update
-                >= self.fingerprint_delay + self.fingerprint_identify_seconds
-                and self.identified == False
-            ):
-                startframe = -self.buffer.framerate * self.fingerprint_identify_seconds
-                sample = self.buffer[startframe:]
-                identification = self.recognizer.recognize(sample)
-                logger.debug("Dejavu results: %s", identification)
-                if results := identification[dejavu.config.settings.RESULTS]:
-                    self.publish(
-                        NewMetadata(
-                            results[0][dejavu.config.settings.SONG_NAME].decode("utf-8")
-                        )
-                    )
-                else:
-                    self.publish(NewMetadata("Unknown Artist - Unknown Album"))
-                self.identified = True
-            elif (
-                now - self.last_update
-                >= self.fingerprint_delay + self.fingerprint_store_seconds
-                and self.captured == False
-            ):
-                startframe = -self.buffer.framerate * self.fingerprint_store_seconds
-                sample = self.buffer[startframe:]
-                with wave.open(self.fingerprint_store_path, "wb") as wavfile:
-                    wavfile.setsampwidth(2)
-                    wavfile.setnchannels(sample.channels)
-                    wavfile.setframerate(sample.framerate)
-                    wavfile.writeframesraw(sample.raw)
-                logger.info("Captured waveform for fingerprinting")
-                self.captured = True
-
         elif self.state == State.silent:
             # Transition back to playing if audio returns within STOP_DELAY
-            # seconds, otherwise transition to idle.
+            # seconds, otherwise the stop timer transitions to idle.
             if level > self.silence_threshold:
                 self.transition(State.playing, now)
-            elif now - self.last_update >= self.stop_delay:
-                self.transition(State.idle, now)
+
+    def identify(self, now: float) -> None:
+        """Identify the playing audio from a window that grows until confident.
+
+        The first attempt fingerprints `fingerprint_min_seconds` of audio. Each
+        following attempt fingerprints only the audio captured since (plus
+        `fingerprint_step_overlap` seconds, so peaks near the old edge still
+        pair up) and queries the combined hashes, until a match reaches
+        `fingerprint_confidence` or the window reaches
+        `fingerprint_identify_seconds`.
+        """
+        framerate = self.buffer.framerate
+        if self.identification is None:
+            if self.wait_for_audio(
+                self.fingerprint_min_seconds, "identify", self.identify
+            ):
+                return
+            start = self.frames - int(framerate * self.fingerprint_min_seconds)
+            self.identification = Identification(start, start, set())
+        identification = self.identification
+        if identification.hashes and identification.end == self.frames:
+            # No new audio to extend the window with yet.
+            self.scheduler.schedule(
+                "identify", now + self.fingerprint_step_seconds, self.identify
+            )
+            return
+        hop = self.recognizer.hop
+        overlap = int(framerate * self.fingerprint_step_overlap)
+        offset = max(identification.end - overlap - identification.start, 0) // hop
+        buffer_start = self.frames - len(self.buffer)
+        if identification.start + offset * hop < buffer_start:
+            # Identification fell so far behind that the audio it would
+            # resume from has left the buffer; carry on from the oldest
+            # audio still available.
+            logger.debug("Identification fell behind the sample buffer")
+            offset = -(-(buffer_start - identification.start) // hop)
+        segment_start = identification.start + offset * hop
+        sample = self.buffer[segment_start - buffer_start :]
+        hashes, fingerprint_time = self.recognizer.fingerprint(sample, offset)
+        identification.hashes |= hashes
+        identification.end = self.frames
+        results, query_time, align_time = self.recognizer.match(identification.hashes)
+        identification.elapsed += fingerprint_time + query_time + align_time
+
+        seconds = (identification.end - identification.start) / framerate
+        confidence = (
+            results[0][dejavu.config.settings.INPUT_CONFIDENCE] if results else 0.0
+        )
+        logger.debug(
+            "Identification after %.1fs: confidence=%.3f, hashes=%d, "
+            "fingerprint=%.2fs, query=%.2fs, align=%.2fs, results=%s",
+            seconds,
+            confidence,
+            len(identification.hashes),
+            fingerprint_time,
+            query_time,
+            align_time,
+            results,
+        )
+        if confidence < self.fingerprint_confidence and (
+            seconds < self.fingerprint_identify_seconds
+        ):
+            self.scheduler.schedule(
+                "identify", now + self.fingerprint_step_seconds, self.identify
+            )
+            return
+        self.matched = confidence >= self.fingerprint_confidence
+        if self.matched:
+            title = results[0][dejavu.config.settings.SONG_NAME].decode("utf-8")
+        else:
+            title = "Unknown Artist - Unknown Album"
+        self.publish(
+            NewMetadata(
+                title,
+                identified=self.matched,
+                confidence=confidence,
+                identified_after=time.monotonic() - self.started_at,
+                recognition_time=identification.elapsed,
+            )
+        )
+        self.identified = True
+        self.identification = None
+        self.ingest()
+        if self.matched:
+            self.recognizer.remember(results[0][dejavu.config.settings.SONG_ID])
+            self.load_neighbours(now)
+
+    def load_neighbours(self, now: float) -> None:
+        """Cache the matched song's neighbours, one per pass of the main loop.
+
+        Each takes a database query, so spreading them out keeps audio and
+        events flowing in between.
+        """
+        if self.recognizer.load_neighbour():
+            self.scheduler.schedule(
+                "load_neighbours", time.monotonic(), self.load_neighbours
+            )
+
+    def capture(self, now: float) -> None:
+        if self.wait_for_audio(self.fingerprint_store_seconds, "capture", self.capture):
+            return
+        startframe = -self.buffer.framerate * self.fingerprint_store_seconds
+        sample = self.buffer[startframe:]
+        write_wave(
+            self.fingerprint_store_path, sample.framerate, sample.channels, sample.raw
+        )
+        logger.info("Captured waveform for fingerprinting")
+        self.captured = True
+        if self.ingest_queue:
+            os.makedirs(self.ingest_path, exist_ok=True)
+            self.session_capture = os.path.join(
+                self.ingest_path,
+                time.strftime("Unknown session %Y-%m-%d %H%M%S.wav"),
+            )
+            write_wave(
+                self.session_capture, sample.framerate, sample.channels, sample.raw
+            )
+            self.ingest()
+
+    def ingest(self, final: bool = False) -> None:
+        """Queue the session's capture for ingestion if it wasn't recognized.
+
+        Waits for identification to finish unless the session is `final`.
+        """
+        if self.session_capture and (self.identified or final):
+            if not self.matched:
+                logger.info("Queueing %s for ingestion", self.session_capture)
+                assert self.ingest_queue
+                self.ingest_queue.put(self.session_capture)
+            else:
+                os.remove(self.session_capture)
+            self.session_capture = None
+
+    def stop(self, now: float) -> None:
+        self.transition(State.idle, now)
 
     def transition(self, to_state: State, updated_at: float) -> None:
         from_state = self.state
@@ -168,8 +753,35 @@ class Turntable(Process):
         self.last_update = updated_at
 
         if to_state == State.idle:
+            self.ingest(final=True)
             self.publish(StoppedPlaying())
             self.identified = False
             self.captured = False
+            self.matched = False
+            self.session_capture = None
         elif from_state == State.idle and to_state == State.playing:
+            self.started_at = updated_at
             self.publish(StartedPlaying())
+
+        self.identification = None
+        if to_state == State.playing:
+            self.scheduler.cancel("stop")
+            if not self.identified:
+                self.scheduler.schedule(
+                    "identify",
+                    updated_at + self.fingerprint_delay + self.fingerprint_min_seconds,
+                    self.identify,
+                )
+            if not self.captured:
+                self.scheduler.schedule(
+                    "capture",
+                    updated_at
+                    + self.fingerprint_delay
+                    + self.fingerprint_store_seconds,
+                    self.capture,
+                )
+        else:
+            self.scheduler.cancel("identify")
+            self.scheduler.cancel("capture")
+            if to_state == State.silent:
+                self.scheduler.schedule("stop", updated_at + self.stop_delay, self.stop)